@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/6.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
+import os
 from celery.schedules import crontab
 
 from pathlib import Path
@@ -46,6 +47,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ticketing.middleware.principal_middleware',
+    'ticketing.middleware.replica_routing_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,29 +74,136 @@ TEMPLATES = [
 
 
 WSGI_APPLICATION = 'Customer_Ticketing.wsgi.application'
+# Live notification streams need the ASGI app, e.g.
+#   uvicorn Customer_Ticketing.asgi:application
+ASGI_APPLICATION = 'Customer_Ticketing.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Production SQLite mode: web requests and Celery write concurrently, so
+# every connection runs in WAL mode with tuned pragmas, transactions take
+# the write lock up front (BEGIN IMMEDIATE) and wait up to `timeout` seconds
+# for it. Remaining lock errors are retried by ticketing.utils.sqlite_retry.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': (
+                'PRAGMA auto_vacuum=INCREMENTAL;'
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA journal_size_limit=67108864'
+            ),
+        },
+    },
+    # Only read from when listed in DATABASE_REPLICAS. Test runs point it at
+    # the test database so routing can be exercised without a second copy.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+SQLITE_WRITE_ATTEMPTS = 5
+SQLITE_RETRY_BASE_DELAY = 0.05
+SQLITE_VACUUM_PAGES = 2000
+
+# Read replicas: GET/HEAD requests read from one of these aliases, except
+# for DATABASE_REPLICA_STICKY_SECONDS after the session's last POST. Writes,
+# sessions, cache fills and Celery tasks always use "default". For a local
+# setup set DATABASE_REPLICAS = ["replica"] and keep the copy fresh with
+# `manage.py replicate_sqlite`.
+DATABASE_ROUTERS = ["ticketing.db_router.ReplicaRouter"]
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_STICKY_SECONDS = 5
+
+# The shared cache holds registry version stamps, cached principals and
+# unread counters, so multi-process deployments need Redis: set
+# CACHE_REDIS_URL (e.g. redis://localhost:6379/1). Without it every process
+# falls back to its own in-memory cache, which is fine for a single dev server.
+if os.environ.get("CACHE_REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["CACHE_REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# How often (seconds) a process re-checks the shared version stamp of the
+# TicketStatus / TicketPriority registries.
+REFERENCE_REGISTRY_CHECK_SECONDS = 5
+
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
+# SLA deadlines are scheduled as ETA tasks. Redis redelivers any message not
+# acknowledged within visibility_timeout, so it must exceed the furthest ETA
+# we schedule; deadlines further out than SLA_MAX_ETA_SECONDS are re-checked
+# at that cap and scheduled again from there.
+SLA_MAX_ETA_SECONDS = 3 * 24 * 3600
+CELERY_BROKER_TRANSPORT_OPTIONS = {"visibility_timeout": SLA_MAX_ETA_SECONDS + 3600}
+
+# How notifications for every active agent of an account are stored:
+# "read" keeps one audience row and creates per-user rows on read/dismiss,
+# "write" fans a recipient row out to each agent from a Celery task.
+NOTIFICATION_AUDIENCE_DELIVERY = "read"
+# Deliver "write" fan-out inline instead of through Celery (tests/dev).
+NOTIFICATION_FANOUT_EAGER = False
+
+# Live notification push (SSE). Only turn it on when the site is served
+# through ASGI_APPLICATION: under WSGI every open page would hold a worker
+# thread and never receive an event. "memory" only reaches streams in the
+# publishing process (tests, single-process dev); set "redis" to publish
+# across processes.
+NOTIFICATION_STREAM_ENABLED = False
+NOTIFICATION_STREAM_BACKEND = "memory"
+NOTIFICATION_STREAM_REDIS_URL = "redis://localhost:6379/2"
+NOTIFICATION_STREAM_HEARTBEAT = 25
+
+# Events on the same ticket for the same recipients are merged into their
+# still-unread notification when it is at most this old (seconds, 0 = off).
+NOTIFICATION_COALESCE_SECONDS = 300
+
+# Retention: read notifications are pruned after READ_DAYS, everything after
+# UNREAD_DAYS. Pruning runs in id windows of BATCH_SIZE with a short pause.
+NOTIFICATION_RETENTION_READ_DAYS = 30
+NOTIFICATION_RETENTION_UNREAD_DAYS = 90
+NOTIFICATION_PRUNE_BATCH_SIZE = 500
+NOTIFICATION_PRUNE_PAUSE_SECONDS = 0.2
+
+# The logged-in AppUser is cached between requests for this many seconds;
+# saves and soft deletes invalidate it immediately.
+PRINCIPAL_CACHE_TTL = 60
+
+# Login/signup password hashing runs on a process pool of this size; past
+# MAX_PENDING queued hashes new sign-ins get an immediate 503.
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_MAX_PENDING = 32
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
 
 CELERY_BEAT_SCHEDULE = {
-    "escalate-expired-tickets-every-5-min": {
+    # Tickets escalate from per-ticket ETA tasks (see ticketing.utils.sla_timers);
+    # this sweep only catches timers whose task was lost.
+    "escalate-expired-tickets-safety-net": {
         "task": "ticketing.tasks.escalate_expired_tickets",
         "schedule": 300.0,  # every 5 minutes
     },
@@ -101,6 +211,18 @@ CELERY_BEAT_SCHEDULE = {
         "task": "ticketing.tasks.auto_close_inactive_tickets",
         "schedule": crontab(hour=0, minute=0),  # daily at midnight
     },
+    "send-notification-digests": {
+        "task": "ticketing.tasks.send_notification_digests",
+        "schedule": 300.0,  # every 5 minutes
+    },
+    "optimize-sqlite": {
+        "task": "ticketing.tasks.optimize_sqlite",
+        "schedule": crontab(minute=30, hour="*/6"),  # every 6 hours
+    },
+    "prune-notifications-nightly": {
+        "task": "ticketing.tasks.prune_notifications",
+        "schedule": crontab(hour=3, minute=0),  # daily at 03:00
+    },
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class TicketingConfig(AppConfig):
     name = 'ticketing'
+
+    def ready(self):
+        # Connects the signals that invalidate cached principals and keep
+        # the search index current.
+        from .utils import principal_cache, search_index  # noqa: F401
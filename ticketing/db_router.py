@@ -0,0 +1,56 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+PRIMARY = "default"
+# Sessions carry the sticky marker below, so they are always read from the primary.
+PRIMARY_ONLY_APPS = {"sessions"}
+
+_read_alias = ContextVar("ticketing_read_alias", default=None)
+
+
+def pick_replica():
+    replicas = getattr(settings, "DATABASE_REPLICAS", [])
+    return random.choice(replicas) if replicas else None
+
+
+def route_reads_to(alias):
+    return _read_alias.set(alias)
+
+
+def reset_reads(token):
+    _read_alias.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    # For loads that fill a shared cache: a lagging replica would pin stale
+    # data there for the whole TTL.
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    # Reads go to a replica only inside a request that opted in (see
+    # replica_routing_middleware); Celery tasks, shells and writes use the primary.
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return PRIMARY
+        return _read_alias.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Once a request writes, its later reads must see that write.
+        _read_alias.set(None)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and are never migrated directly.
+        return db == PRIMARY
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...utils.thread_counters import sync_thread_counters
+
+
+class Command(BaseCommand):
+    help = "Backfills reply_count, last_reply_at and participant_ids on root comment threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report threads whose counters are out of date; exit non-zero if any are."
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        checked, mismatched = sync_thread_counters(
+            fix=not options["verify"],
+            batch_size=options["batch_size"]
+        )
+        if options["verify"]:
+            if mismatched:
+                raise CommandError(f"{mismatched} of {checked} threads have stale counters.")
+            self.stdout.write(self.style.SUCCESS(f"All {checked} thread counters are up to date."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Checked {checked} threads, fixed {mismatched}."))
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import time
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from ...utils import password_pool
+
+
+class Command(BaseCommand):
+    help = "Measures password checks (logins) per second inline and on the hashing pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=50)
+        parser.add_argument("--password", default="correct horse battery staple")
+
+    def handle(self, *args, **options):
+        logins = options["logins"]
+        encoded = make_password(options["password"])
+
+        started = time.perf_counter()
+        for _ in range(logins):
+            check_password(options["password"], encoded)
+        inline_rate = logins / (time.perf_counter() - started)
+        self.stdout.write(f"inline:  {inline_rate:.1f} logins/s on 1 core")
+
+        workers = password_pool._get_pool()._max_workers
+        elapsed, rejected = self.run_pool(options["password"], encoded, logins)
+        pool_rate = (logins - rejected) / elapsed
+        self.stdout.write(
+            f"pool:    {pool_rate:.1f} logins/s on {workers} workers "
+            f"({pool_rate / workers:.1f} per core, {rejected} rejected as busy, {os.cpu_count()} cpus)"
+        )
+
+    def run_pool(self, password, encoded, logins):
+        # Warm the worker processes so start-up cost is not measured.
+        password_pool.verify_password(password, encoded)
+
+        async def login():
+            try:
+                await password_pool.averify_password(password, encoded)
+                return 0
+            except password_pool.HashingPoolBusy:
+                return 1
+
+        async def run():
+            # Concurrent requests await the pool from one event loop, as the async login view does.
+            return await asyncio.gather(*(login() for _ in range(logins)))
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        return time.perf_counter() - started, sum(results)
@@ -0,0 +1,128 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ...utils.sqlite_retry import is_lock_error
+
+SCHEMA = """
+CREATE TABLE ticket (id INTEGER PRIMARY KEY, events INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE notification (id INTEGER PRIMARY KEY, ticket_id INTEGER NOT NULL, purpose TEXT NOT NULL);
+CREATE INDEX notification_ticket ON notification (ticket_id);
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent read-then-write transactions against a scratch SQLite file, "
+        "first with SQLite defaults and then with the production settings, and reports throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument(
+            "--dir",
+            default=None,
+            help="Directory for the scratch database; use the same disk as production for meaningful fsync costs."
+        )
+
+    def handle(self, *args, **options):
+        options_ = settings.DATABASES["default"].get("OPTIONS", {})
+        modes = [
+            ("defaults", {"pragmas": [], "begin": "BEGIN", "timeout": 5, "retry": False}),
+            ("production", {
+                "pragmas": [p.strip() for p in options_.get("init_command", "").split(";") if p.strip()],
+                "begin": f"BEGIN {options_.get('transaction_mode', 'IMMEDIATE')}",
+                "timeout": options_.get("timeout", 20),
+                "retry": True,
+            }),
+        ]
+        for name, mode in modes:
+            result = self.run_mode(mode, options)
+            self.stdout.write(
+                f"{name:<11} {result['commits'] / options['seconds']:8.1f} writes/s  "
+                f"{result['reads'] / options['seconds']:8.1f} reads/s  "
+                f"{result['errors']} lock errors  {result['retries']} retries"
+            )
+
+    def run_mode(self, mode, options):
+        with tempfile.TemporaryDirectory(dir=options["dir"]) as directory:
+            path = os.path.join(directory, "contention.sqlite3")
+            setup = self.connect(path, mode)
+            setup.executescript(SCHEMA)
+            setup.executemany("INSERT INTO ticket (id) VALUES (?)", [(i,) for i in range(1, 51)])
+            setup.close()
+
+            result = {"commits": 0, "reads": 0, "errors": 0, "retries": 0}
+            lock = threading.Lock()
+            deadline = time.monotonic() + options["seconds"]
+            threads = [
+                threading.Thread(target=self.writer, args=(path, mode, deadline, result, lock))
+                for _ in range(options["writers"])
+            ] + [
+                threading.Thread(target=self.reader, args=(path, mode, deadline, result, lock))
+                for _ in range(options["readers"])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return result
+
+    def connect(self, path, mode):
+        connection = sqlite3.connect(path, timeout=mode["timeout"], isolation_level=None, check_same_thread=False)
+        for pragma in mode["pragmas"]:
+            connection.execute(pragma)
+        return connection
+
+    def writer(self, path, mode, deadline, result, lock):
+        connection = self.connect(path, mode)
+        attempts = getattr(settings, "SQLITE_WRITE_ATTEMPTS", 5) if mode["retry"] else 1
+        base_delay = getattr(settings, "SQLITE_RETRY_BASE_DELAY", 0.05)
+        while time.monotonic() < deadline:
+            ticket_id = random.randint(1, 50)
+            for attempt in range(1, attempts + 1):
+                try:
+                    # Same shape as the ORM paths: read inside the transaction, then write.
+                    connection.execute(mode["begin"])
+                    connection.execute("SELECT events FROM ticket WHERE id = ?", (ticket_id,)).fetchone()
+                    connection.execute("INSERT INTO notification (ticket_id, purpose) VALUES (?, ?)", (ticket_id, "x" * 80))
+                    connection.execute("UPDATE ticket SET events = events + 1 WHERE id = ?", (ticket_id,))
+                    connection.execute("COMMIT")
+                    with lock:
+                        result["commits"] += 1
+                    break
+                except sqlite3.OperationalError as exc:
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                    if not is_lock_error(exc):
+                        raise
+                    if attempt == attempts:
+                        with lock:
+                            result["errors"] += 1
+                        break
+                    with lock:
+                        result["retries"] += 1
+                    time.sleep(random.uniform(0, base_delay * 2 ** (attempt - 1)))
+        connection.close()
+
+    def reader(self, path, mode, deadline, result, lock):
+        connection = self.connect(path, mode)
+        while time.monotonic() < deadline:
+            try:
+                connection.execute(
+                    "SELECT COUNT(*) FROM notification WHERE ticket_id = ?", (random.randint(1, 50),)
+                ).fetchone()
+                with lock:
+                    result["reads"] += 1
+            except sqlite3.OperationalError as exc:
+                if not is_lock_error(exc):
+                    raise
+                with lock:
+                    result["errors"] += 1
+        connection.close()
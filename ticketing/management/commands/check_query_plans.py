@@ -0,0 +1,99 @@
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.http import QueryDict
+from django.utils import timezone
+from ...models.comments import Thread
+from ...models.tickets import Ticket, TicketStatus, status_registry
+from ...models.users import AppUser, UserType
+from ...notification_context import audience_unread, direct_unread, latest_notifications
+from ...serializers.ticket_json import DEFAULT_TICKET_FIELDS
+from ...tasks import auto_close_batch, escalation_batch, escalation_source_statuses
+from ...utils.boards import board_cards, board_counts
+from ...utils.pagination import encode_cursor
+from ...views.ticket_views import API_PAGE_SIZE, ticket_list_queryset
+from ...views.user_views import (
+    active_agents,
+    agent_board_tickets,
+    customer_board_tickets,
+    unassigned_page_queryset,
+    unassigned_queue,
+)
+
+
+def hot_queries():
+    # The querysets the views and tasks run, built through the same helpers
+    # with placeholder ids; only the plan matters, not the rows.
+    now = timezone.now()
+    customer = AppUser(id=1, account_id_id=1, role=UserType.CUSTOMER, is_active=True)
+    agent = AppUser(id=2, account_id_id=1, role=UserType.AGENT, is_active=True)
+    waiting_status = status_registry.get("Waiting-For-Customer")
+    cursor = QueryDict(f"cursor={encode_cursor(now, 1)}")
+    return {
+        "escalation sweep (tasks.escalate_expired_tickets)": escalation_batch(now, escalation_source_statuses()),
+        "auto-close sweep (tasks.auto_close_inactive_tickets)": auto_close_batch(waiting_status, now, now, 1),
+        "customer board cards (CustomerDashboardPageView)": board_cards(customer_board_tickets(customer)),
+        "customer board counts (CustomerDashboardPageView)": board_counts(customer_board_tickets(customer)),
+        "agent board cards (AgentDashboardPageView)": board_cards(agent_board_tickets(agent)),
+        "agent board counts (AgentDashboardPageView)": board_counts(agent_board_tickets(agent)),
+        "unassigned queue (AgentDashboardPageView)": unassigned_page_queryset(unassigned_queue(agent.account_id_id)),
+        "ticket list page (TicketListApiView)": ticket_list_queryset(
+            Ticket.objects.filter(creator_id__account_id=agent.account_id_id), cursor, DEFAULT_TICKET_FIELDS
+        )[:API_PAGE_SIZE + 1],
+        "active agents (CustomerDashboardPageView)": active_agents(agent.account_id_id),
+        "latest notifications (notification_context)": latest_notifications(agent),
+        "unread count (notification_context)": direct_unread(agent).values("id"),
+        "unread audience count (notification_context)": audience_unread(agent).values("id"),
+        "thread replies (ThreadRepliesView, Thread.replies)": Thread(id=1, thread_group=uuid.uuid4()).replies,
+    }
+
+
+def full_scans(plan_rows):
+    scans = []
+    # Window queries materialise an already filtered subquery as a co-routine;
+    # scanning that is not a table scan.
+    coroutines = {row[-1].split(" ", 1)[1] for row in plan_rows if row[-1].startswith("CO-ROUTINE ")}
+    for row in plan_rows:
+        detail = row[-1]
+        # "SCAN t" reads the whole table; "SCAN t USING [COVERING] INDEX" still walks every entry.
+        if not detail.startswith("SCAN ") or "CONSTANT ROW" in detail:
+            continue
+        if detail[len("SCAN "):] in coroutines:
+            continue
+        scans.append(detail)
+    return scans
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN QUERY PLAN on the hot ticket/notification queries and fails on full table scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "sqlite":
+            raise CommandError("check_query_plans only understands SQLite query plans.")
+
+        try:
+            queries = hot_queries()
+        except TicketStatus.DoesNotExist as exc:
+            raise CommandError(f"{exc} Load the ticket statuses first.")
+
+        failures = []
+        for name, queryset in queries.items():
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                plan = cursor.fetchall()
+
+            scans = full_scans(plan)
+            status = self.style.ERROR("FULL SCAN") if scans else self.style.SUCCESS("ok")
+            self.stdout.write(f"{status}  {name}")
+            for row in plan:
+                self.stdout.write(f"      {row[-1]}")
+            if scans:
+                failures.append(name)
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries fall back to a full table scan: {', '.join(failures)}")
@@ -0,0 +1,38 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from ...models.users import Account
+from ...utils.ticket_export import EXPORT_FORMATS, account_tickets, parse_since, stream_export
+
+
+class Command(BaseCommand):
+    help = "Streams every ticket of an account, with its history and comment counts, as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("account", type=int, help="Account id to export.")
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+        parser.add_argument("--since", help="Only tickets changed, commented on or replied to (and history recorded) at or after this ISO datetime.")
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output.")
+        parser.add_argument("--output", help="File to write to; defaults to stdout.")
+
+    def handle(self, *args, **options):
+        if not Account.objects.filter(pk=options["account"]).exists():
+            raise CommandError(f"Account {options['account']} does not exist.")
+        try:
+            since = parse_since(options["since"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        chunks = stream_export(
+            account_tickets(options["account"]),
+            options["format"],
+            since=since,
+            gzip=options["gzip"]
+        )
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
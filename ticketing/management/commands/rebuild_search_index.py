@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...utils.search_index import enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index over ticket titles, descriptions and comment threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        if not enabled(options["database"]):
+            raise CommandError("Full-text search needs an SQLite database with FTS5.")
+        rows = rebuild_index(using=options["database"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {rows} tickets and comments."))
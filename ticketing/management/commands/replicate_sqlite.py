@@ -0,0 +1,40 @@
+import sqlite3
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Stand-in replicator: copies the primary SQLite database onto a replica file with the online backup API."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default="default", help="Database alias to copy from.")
+        parser.add_argument("--target", default="replica", help="Database alias to copy to.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds between copies.")
+        parser.add_argument("--once", action="store_true", help="Copy once and exit.")
+
+    def handle(self, *args, **options):
+        source = self.sqlite_path(options["source"])
+        target = self.sqlite_path(options["target"])
+
+        while True:
+            started = time.monotonic()
+            src, dst = sqlite3.connect(source), sqlite3.connect(target)
+            try:
+                src.backup(dst)
+            finally:
+                src.close()
+                dst.close()
+            elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+            self.stdout.write(f"Copied {options['source']} -> {options['target']} in {elapsed_ms}ms")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
+
+    def sqlite_path(self, alias):
+        config = settings.DATABASES.get(alias)
+        if not config:
+            raise CommandError(f"Unknown database alias '{alias}'.")
+        if config["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError(f"'{alias}' is not a SQLite database.")
+        return str(config["NAME"])
@@ -0,0 +1,82 @@
+import time
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject
+from . import db_router
+from .utils import principal_cache
+
+STICKY_SESSION_KEY = "db_primary_until"
+READ_ONLY_METHODS = ("GET", "HEAD")
+
+
+def _load_principal(request):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return None
+    user = principal_cache.get_user(user_id)
+    account_id = request.session.get("account_id")
+    if user is None or (account_id and user.account_id_id != account_id):
+        return None
+    return user
+
+
+@sync_and_async_middleware
+def principal_middleware(get_response):
+    # request.principal is the session's AppUser (falsy when there is none),
+    # resolved at most once per request and only when something reads it.
+    # Mixins and function views use it instead of loading the user themselves.
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            request.principal = SimpleLazyObject(lambda: _load_principal(request))
+            return await get_response(request)
+    else:
+        def middleware(request):
+            request.principal = SimpleLazyObject(lambda: _load_principal(request))
+            return get_response(request)
+    return middleware
+
+
+def _read_alias_for(method, primary_until):
+    if method not in READ_ONLY_METHODS:
+        return None
+    if primary_until and primary_until > time.time():
+        return None
+    return db_router.pick_replica()
+
+
+def _stick_to_primary(request, response):
+    # Read your own writes: after a POST the session reads from the primary
+    # until replicas have had time to catch up.
+    if request.method not in READ_ONLY_METHODS and response.status_code < 500:
+        window = getattr(settings, "DATABASE_REPLICA_STICKY_SECONDS", 5)
+        request.session[STICKY_SESSION_KEY] = time.time() + window
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not getattr(settings, "DATABASE_REPLICAS", []):
+                return await get_response(request)
+            primary_until = await request.session.aget(STICKY_SESSION_KEY)
+            token = db_router.route_reads_to(_read_alias_for(request.method, primary_until))
+            try:
+                response = await get_response(request)
+            finally:
+                db_router.reset_reads(token)
+            _stick_to_primary(request, response)
+            return response
+    else:
+        def middleware(request):
+            if not getattr(settings, "DATABASE_REPLICAS", []):
+                return get_response(request)
+            primary_until = request.session.get(STICKY_SESSION_KEY)
+            token = db_router.route_reads_to(_read_alias_for(request.method, primary_until))
+            try:
+                response = get_response(request)
+            finally:
+                db_router.reset_reads(token)
+            _stick_to_primary(request, response)
+            return response
+    return middleware
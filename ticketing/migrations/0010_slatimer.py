@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_sla_timers(apps, schema_editor):
+    Ticket = apps.get_model("ticketing", "Ticket")
+    SLATimer = apps.get_model("ticketing", "SLATimer")
+    open_tickets = Ticket.objects.filter(
+        deadline__isnull=False,
+        status__status__in=["In-Progress", "Waiting-For-Customer"]
+    ).values_list("id", "deadline")
+    SLATimer.objects.bulk_create(
+        [SLATimer(ticket_id=ticket_id, due_at=deadline) for ticket_id, deadline in open_tickets.iterator()],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0009_sweepcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SLATimer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_at', models.DateTimeField(db_index=True)),
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sla_timer', to='ticketing.ticket')),
+            ],
+        ),
+        migrations.RunPython(backfill_sla_timers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_thread_counters(apps, schema_editor):
+    Thread = apps.get_model("ticketing", "Thread")
+    Comment = apps.get_model("ticketing", "Comment")
+    root_ids = Comment.objects.values("thread_id")
+
+    last_id = 0
+    while True:
+        roots = list(
+            Thread.objects.filter(id__in=root_ids, id__gt=last_id)
+            .order_by("id")
+            .only("id", "thread_group", "commented_by_id")[:500]
+        )
+        if not roots:
+            break
+        last_id = roots[-1].id
+
+        replies = Thread.objects.filter(
+            thread_group__in=[root.thread_group for root in roots]
+        ).exclude(id__in=root_ids)
+        stats = {
+            row["thread_group"]: row
+            for row in replies.values("thread_group").annotate(total=Count("id"), last=Max("created_at"))
+        }
+        authors = {}
+        for group, author_id in replies.values_list("thread_group", "commented_by_id").distinct():
+            authors.setdefault(group, set()).add(author_id)
+
+        for root in roots:
+            row = stats.get(root.thread_group)
+            if row:
+                Thread.objects.filter(pk=root.pk).update(
+                    reply_count=row["total"],
+                    last_reply_at=row["last"],
+                    participant_ids=sorted(authors[root.thread_group] | {root.commented_by_id})
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='last_reply_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='participant_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_thread_counters, migrations.RunPython.noop),
+    ]
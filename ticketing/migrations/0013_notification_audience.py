@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0012_thread_reply_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='audience',
+            field=models.CharField(choices=[('Direct', 'Direct'), ('Account Agents', 'Account Agents')], default='Direct', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='audience_account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='audience_notifications', to='ticketing.account'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+from django.db import migrations, models
+from django.db.models import Max, Min, Q
+
+
+def backfill_read_watermarks(apps, schema_editor):
+    # Watermark = just below the oldest unread notification (or the newest
+    # read one); rows above it keep their individual is_read flags.
+    AppUser = apps.get_model("ticketing", "AppUser")
+    NotificationRecipient = apps.get_model("ticketing", "NotificationRecipient")
+    per_user = NotificationRecipient.objects.values("user_id").annotate(
+        first_unread=Min("notification_id", filter=Q(is_read=False)),
+        last_seen=Max("notification_id")
+    )
+    for row in per_user.iterator():
+        if row["first_unread"] is not None:
+            watermark = row["first_unread"] - 1
+        else:
+            watermark = row["last_seen"]
+        AppUser.objects.filter(pk=row["user_id"]).update(notifications_read_up_to=watermark)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0013_notification_audience'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appuser',
+            name='notifications_read_up_to',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_read_watermarks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0014_notification_read_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appuser',
+            name='notification_digest',
+            field=models.CharField(choices=[('Immediate', 'Immediate'), ('Hourly', 'Hourly'), ('Daily', 'Daily')], default='Immediate', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='event_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='NotificationDigestEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.TextField()),
+                ('event_count', models.PositiveIntegerField(default=1)),
+                ('first_event_at', models.DateTimeField()),
+                ('last_event_at', models.DateTimeField()),
+                ('notifier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ticketing.appuser')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ticketing.ticket')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_entries', to='ticketing.appuser')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['first_event_at'], name='digest_first_event_idx')],
+                'unique_together': {('user', 'ticket')},
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# The SQL is frozen here rather than imported from ticketing.utils.search_index,
+# which loads the live models and may change after this migration.
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS ticketing_search USING fts5("
+    "account, ticket, title, body, kind UNINDEXED, tokenize = 'porter unicode61', prefix = '3 4')"
+)
+DROP_TABLE = "DROP TABLE IF EXISTS ticketing_search"
+
+INDEX_TICKETS = """
+    INSERT INTO ticketing_search (rowid, account, ticket, title, body, kind)
+    SELECT t.id * 2, 'a' || u.account_id_id, 't' || t.id, t.title, t.description, 'ticket'
+    FROM ticketing_ticket t JOIN ticketing_appuser u ON u.id = t.creator_id_id
+"""
+INDEX_THREADS = """
+    INSERT INTO ticketing_search (rowid, account, ticket, title, body, kind)
+    SELECT th.id * 2 + 1, 'a' || u.account_id_id, 't' || c.ticket_id, '', th.body, 'comment'
+    FROM ticketing_comment c
+    JOIN ticketing_thread root ON root.id = c.thread_id
+    JOIN ticketing_thread th ON th.thread_group = root.thread_group
+    JOIN ticketing_ticket t ON t.id = c.ticket_id
+    JOIN ticketing_appuser u ON u.id = t.creator_id_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(CREATE_TABLE)
+    schema_editor.execute("DELETE FROM ticketing_search")
+    schema_editor.execute(INDEX_TICKETS)
+    schema_editor.execute(INDEX_THREADS)
+    schema_editor.execute("INSERT INTO ticketing_search (ticketing_search) VALUES ('optimize')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(DROP_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0016_notification_sent_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
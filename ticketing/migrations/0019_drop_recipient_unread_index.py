@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticketing', '0018_ticket_changed_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notificationrecipient',
+            name='recipient_unread_idx',
+        ),
+    ]
@@ -1,2 +1,3 @@
 from .users import AppUser,Account
-from .tickets import Ticket,TicketHistory
\ No newline at end of file
+from .tickets import Ticket,TicketHistory
+from .scheduling import SweepCheckpoint, SLATimer
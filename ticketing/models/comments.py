@@ -1,5 +1,6 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from .users import AppUser
 from .tickets import Ticket
 
@@ -8,6 +9,15 @@ class Thread(models.Model):
     body = models.TextField(max_length=450)
     commented_by = models.ForeignKey(AppUser, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained on the root thread of a group by record_reply().
+    reply_count = models.PositiveIntegerField(default=0)
+    last_reply_at = models.DateTimeField(null=True, blank=True)
+    participant_ids = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["thread_group", "created_at"], name="thread_group_created_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         self.full_clean()
@@ -17,6 +27,23 @@ class Thread(models.Model):
     def replies(self):
         return Thread.objects.filter(thread_group=self.thread_group).exclude(id=self.id).order_by("created_at")
 
+    def record_reply(self, reply):
+        with transaction.atomic():
+            root = Thread.objects.select_for_update().only("commented_by_id", "participant_ids").get(pk=self.pk)
+            participants = set(root.participant_ids) | {root.commented_by_id, reply.commented_by_id}
+            Thread.objects.filter(pk=self.pk).update(
+                reply_count=F("reply_count") + 1,
+                last_reply_at=reply.created_at,
+                participant_ids=sorted(participants)
+            )
+        self.participant_ids = sorted(participants)
+
+    @classmethod
+    def comment_roots(cls, ticket):
+        # Root threads only, newest first; reply_count and last_reply_at stand
+        # in for the replies, which ThreadRepliesView loads when opened.
+        return cls.objects.filter(comment_entry__ticket=ticket).select_related("commented_by").order_by("-created_at", "-id")
+
 
 class Comment(models.Model):
     ticket = models.ForeignKey(
@@ -1,5 +1,5 @@
 from django.db import models
-from ..models.users import AppUser
+from ..models.users import Account, AppUser, UserType
 from ..models.tickets import Ticket
 
 class TicketPurpose(models.TextChoices):
@@ -8,6 +8,11 @@ class TicketPurpose(models.TextChoices):
     Comment="Comment"
 
 
+class NotificationAudience(models.TextChoices):
+    DIRECT = "Direct"
+    ACCOUNT_AGENTS = "Account Agents"
+
+
 class Notification(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE)
     notifier = models.ForeignKey(
@@ -20,10 +25,65 @@ class Notification(models.Model):
         choices=TicketPurpose.choices
     )
     sent_at = models.DateTimeField(auto_now_add=True)
+    # Events merged into this notification (see NOTIFICATION_COALESCE_SECONDS).
+    event_count = models.PositiveIntegerField(default=1)
+    # Account-wide notifications are stored once; per-user recipient rows
+    # are only created when a user reads or dismisses them.
+    audience = models.CharField(
+        max_length=20,
+        choices=NotificationAudience.choices,
+        default=NotificationAudience.DIRECT
+    )
+    audience_account = models.ForeignKey(
+        Account,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="audience_notifications"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["sent_at"], name="notification_sent_at_idx"),
+        ]
 
     def __str__(self):
         return f"{self.purpose} - Ticket {self.ticket.id}"
 
+    @staticmethod
+    def audience_account_for(user):
+        if user.role == UserType.AGENT and user.is_active:
+            return user.account_id_id
+        return None
+
+    @classmethod
+    def visible_to(cls, user):
+        visible = models.Q(id__in=NotificationRecipient.objects.filter(user_id=user.id).values("notification_id"))
+        account_id = cls.audience_account_for(user)
+        if account_id:
+            visible |= models.Q(audience=NotificationAudience.ACCOUNT_AGENTS, audience_account_id=account_id)
+        return cls.objects.filter(visible)
+
+    @classmethod
+    def unread_for(cls, user):
+        # Unread = above the user's read watermark and not read individually.
+        unread = models.Q(id__in=NotificationRecipient.objects.filter(
+            user_id=user.id, is_read=False, notification_id__gt=user.notifications_read_up_to
+        ).values("notification_id"))
+        account_id = cls.audience_account_for(user)
+        if account_id:
+            unread |= models.Q(
+                models.Q(
+                    audience=NotificationAudience.ACCOUNT_AGENTS,
+                    audience_account_id=account_id,
+                    id__gt=user.notifications_read_up_to
+                ),
+                ~models.Q(id__in=NotificationRecipient.objects.filter(
+                    user_id=user.id, is_read=True
+                ).values("notification_id"))
+            )
+        return cls.objects.filter(unread)
+
 
 class NotificationRecipient(models.Model):
     notification = models.ForeignKey(
@@ -40,6 +100,37 @@ class NotificationRecipient(models.Model):
 
     class Meta:
         unique_together = ("notification", "user")
+        indexes = [
+            models.Index(fields=["user", "is_read"], name="recipient_user_read_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} notified"
+
+
+class NotificationDigestEntry(models.Model):
+    # Pending events for users on an hourly/daily digest, one row per ticket.
+    user = models.ForeignKey(
+        AppUser,
+        on_delete=models.CASCADE,
+        related_name="digest_entries"
+    )
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE)
+    notifier = models.ForeignKey(
+        AppUser,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    purpose = models.TextField()
+    event_count = models.PositiveIntegerField(default=1)
+    first_event_at = models.DateTimeField()
+    last_event_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "ticket")
+        indexes = [
+            models.Index(fields=["first_event_at"], name="digest_first_event_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} digest - Ticket {self.ticket_id}"
@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class SweepCheckpoint(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    cursor = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.cursor}"
+
+
+class SLATimer(models.Model):
+    ticket = models.OneToOneField(
+        "ticketing.Ticket",
+        on_delete=models.CASCADE,
+        related_name="sla_timer"
+    )
+    due_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"SLA timer for Ticket {self.ticket_id} due {self.due_at}"
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from .users import AppUser, UserType
+from ..utils.reference_registry import ReferenceRegistry
+from ..utils.sla_timers import sync_sla_timer
+from ..utils.sqlite_retry import run_with_retry
 
 class TicketStatus(models.Model):
     status = models.CharField(max_length=70, unique=True)
@@ -17,6 +20,10 @@ class TicketPriority(models.Model):
         return self.priority
 
 
+status_registry = ReferenceRegistry(TicketStatus, "status")
+priority_registry = ReferenceRegistry(TicketPriority, "priority")
+
+
 class Ticket(models.Model):
     creator_id = models.ForeignKey(
         AppUser,
@@ -46,18 +53,135 @@ class Ticket(models.Model):
         limit_choices_to={'role': UserType.AGENT}
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "deadline"], name="ticket_status_deadline_idx"),
+            models.Index(fields=["status", "changed_at"], name="ticket_status_changed_idx"),
+            models.Index(fields=["assignee_id", "status"], name="ticket_assignee_status_idx"),
+            models.Index(fields=["creator_id", "status"], name="ticket_creator_status_idx"),
+            models.Index(fields=["changed_at", "id"], name="ticket_changed_idx"),
+            models.Index(
+                fields=["status", "created_at"],
+                condition=models.Q(assignee_id__isnull=True),
+                name="ticket_unassigned_idx"
+            ),
+        ]
+
+    TRACKED_FIELDS = [
+        "title",
+        "description",
+        "priority_id",
+        "status",
+        "assignee_id",
+        "ticket_category",
+        "start_time",
+        "deadline",
+    ]
+    TRACKED_RELATIONS = ["priority_id", "status", "assignee_id"]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._attach_reference_objects()
+        instance._take_snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._attach_reference_objects()
+        if fields is None:
+            self._take_snapshot()
+            return
+        # Only the reloaded columns move; unsaved edits to the others still diff against the old snapshot.
+        snapshot = self.__dict__.setdefault("_snapshot", {})
+        display = self.__dict__.setdefault("_snapshot_display", {})
+        for field in self._meta.concrete_fields:
+            if (field.name in fields or field.attname in fields) and field.attname in self._snapshot_attnames():
+                snapshot[field.attname] = self.__dict__[field.attname]
+                display.pop(field.name, None)
+
+    def __setattr__(self, name, value):
+        # Remember the display value of a loaded relation before it is replaced,
+        # so the history diff does not have to look the old object up again.
+        if name in self.TRACKED_RELATIONS and "_snapshot" in self.__dict__:
+            self._remember_display(name)
+        super().__setattr__(name, value)
+
+    def _attach_reference_objects(self):
+        for name, registry in (("status", status_registry), ("priority_id", priority_registry)):
+            field = self._meta.get_field(name)
+            pk = self.__dict__.get(field.attname)
+            if pk is not None and not field.is_cached(self):
+                try:
+                    field.set_cached_value(self, registry.by_id(pk))
+                except field.related_model.DoesNotExist:
+                    pass
+
+    def _snapshot_attnames(self):
+        return [self._meta.get_field(name).attname for name in self.TRACKED_FIELDS + ["changed_at"]]
+
+    def _take_snapshot(self):
+        self._snapshot = {
+            attname: self.__dict__[attname]
+            for attname in self._snapshot_attnames()
+            if attname in self.__dict__
+        }
+        self._snapshot_display = {}
+
+    def _load_snapshot(self):
+        missing = [attname for attname in self._snapshot_attnames() if attname not in self._snapshot]
+        if missing:
+            row = Ticket.objects.filter(pk=self.pk).values(*missing).first() or {}
+            self._snapshot.update(row)
+        return self._snapshot
+
+    @staticmethod
+    def _display(field, obj):
+        if obj is None:
+            return None
+        if field == "assignee_id":
+            return f"{obj.name} ({obj.job_title})"
+        if field == "status":
+            return obj.status
+        return obj.priority
+
+    def _remember_display(self, name):
+        field = self._meta.get_field(name)
+        if name in self._snapshot_display or not field.is_cached(self):
+            return
+        related = field.get_cached_value(self)
+        if related is not None and related.pk == self._snapshot.get(field.attname):
+            self._snapshot_display[name] = self._display(name, related)
+
+    def _old_display(self, name, old_id):
+        if old_id is None:
+            return None
+        if name not in self._snapshot_display:
+            related_model = self._meta.get_field(name).related_model
+            try:
+                if name == "status":
+                    old_obj = status_registry.by_id(old_id)
+                elif name == "priority_id":
+                    old_obj = priority_registry.by_id(old_id)
+                else:
+                    old_obj = related_model.objects.get(pk=old_id)
+            except related_model.DoesNotExist:
+                old_obj = None
+            self._snapshot_display[name] = self._display(name, old_obj)
+        return self._snapshot_display[name]
+
     def save(self, *args, **kwargs):
         updated_by = kwargs.pop("updated_by", None)
         is_update = self.pk is not None
-        old_ticket = Ticket.objects.get(pk=self.pk) if is_update else None
+        if is_update and "_snapshot" not in self.__dict__:
+            self._snapshot = {}
+            self._snapshot_display = {}
+        old = self._load_snapshot() if is_update else None
+        self._attach_reference_objects()
         now = timezone.now()
 
-        # Determine if status changed
-        old_status = old_ticket.status if old_ticket else None
-        status_changed = old_status and old_status != self.status
-
         if self.status.status == "In-Progress":
-            if not old_ticket or old_ticket.status.status != "In-Progress":
+            if not old or old.get("status_id") != self.status_id:
                 self.start_time = now
                 self.deadline = now + self.priority_id.duration if self.priority_id else None
 
@@ -66,44 +190,48 @@ class Ticket(models.Model):
                 and self.status.status not in ["Resolved", "Closed", "Escalated"]
                 and now > self.deadline
         ):
-            escalated_status = TicketStatus.objects.get(status="Escalated")
+            escalated_status = status_registry.get("Escalated")
             self.status = escalated_status
 
         if self.status.status == "Waiting-For-Customer":
             inactivity_limit_days = 1
-            last_change = old_ticket.changed_at if old_ticket else self.created_at
-            if (now - last_change).days >= inactivity_limit_days:
-                closed_status = TicketStatus.objects.get(status="Closed")
+            last_change = old.get("changed_at") if old else self.created_at
+            if last_change and (now - last_change).days >= inactivity_limit_days:
+                closed_status = status_registry.get("Closed")
                 self.status = closed_status
 
+        adding = self._state.adding
+        pk = self.pk
+
+        def write():
+            if adding:
+                # A retried insert must not reuse the pk of the rolled-back attempt.
+                self.pk, self._state.adding = pk, True
+            with transaction.atomic():
+                self._save_and_record(old, updated_by, is_update, *args, **kwargs)
+
+        run_with_retry(write)
+        self._take_snapshot()
+
+    def _save_and_record(self, old, updated_by, is_update, *args, **kwargs):
         super().save(*args, **kwargs)
 
+        if not old or old.get("deadline") != self.deadline or old.get("status_id") != self.status_id:
+            sync_sla_timer(self, old.get("deadline") if old else None)
+
         if is_update and updated_by:
             history_data = {}
-            fields_to_track = [
-                "title",
-                "description",
-                "priority_id",
-                "status",
-                "assignee_id",
-                "ticket_category",
-                "start_time",
-                "deadline",
-            ]
-
-            for field in fields_to_track:
-                old_value = getattr(old_ticket, field) if old_ticket else None
-                new_value = getattr(self, field)
-
-                if field in ["assignee_id", "creator_id"]:
-                    old_value = f"{old_value.name} ({old_value.job_title})" if old_value else None
-                    new_value = f"{new_value.name} ({new_value.job_title})" if new_value else None
-                elif field == "status":
-                    old_value = old_value.status if old_value else None
-                    new_value = new_value.status if new_value else None
-                elif field == "priority_id":
-                    old_value = old_value.priority if old_value else None
-                    new_value = new_value.priority if new_value else None
+
+            for field in self.TRACKED_FIELDS:
+                attname = self._meta.get_field(field).attname
+                old_value = old.get(attname)
+                new_value = getattr(self, attname)
+
+                if field in self.TRACKED_RELATIONS:
+                    if old_value == new_value:
+                        continue
+                    old_value = self._old_display(field, old_value)
+                    new_value = self._display(field, getattr(self, field))
                 elif isinstance(old_value, timezone.datetime) or isinstance(new_value, timezone.datetime):
                     old_value = old_value.strftime("%d %b %Y %H:%M:%S") if old_value else None
                     new_value = new_value.strftime("%d %b %Y %H:%M:%S") if new_value else None
@@ -6,6 +6,11 @@ class UserType(models.TextChoices):
     CUSTOMER = "Customer","Customer"
     SYSTEM = "System","System"
 
+class DigestFrequency(models.TextChoices):
+    IMMEDIATE = "Immediate","Immediate"
+    HOURLY = "Hourly","Hourly"
+    DAILY = "Daily","Daily"
+
 class Account(models.Model):
     portal=models.CharField(max_length=255,unique=True)
 
@@ -21,8 +26,22 @@ class AppUser(models.Model):
     )
     is_active = models.BooleanField(default=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    # Every notification with an id up to this one counts as read.
+    notifications_read_up_to = models.BigIntegerField(default=0)
+    notification_digest = models.CharField(
+        max_length=10,
+        choices=DigestFrequency.choices,
+        default=DigestFrequency.IMMEDIATE
+    )
 
     class Meta:
         constraints=[
             UniqueConstraint(fields=('account_id','email'),name='unique_agent')
+        ]
+        indexes=[
+            models.Index(
+                fields=['account_id','role'],
+                condition=models.Q(is_active=True),
+                name='appuser_active_role_idx'
+            )
         ]
\ No newline at end of file
@@ -1,21 +1,49 @@
-from .models.notifications import NotificationRecipient
+from django.conf import settings
+from .models.notifications import Notification, NotificationAudience, NotificationRecipient
+from .serializers.user_form import NotificationDigestForm
+from .utils import notification_cache
+
+def direct_unread(user):
+    return NotificationRecipient.objects.filter(
+        user_id=user.id,
+        is_read=False,
+        notification_id__gt=user.notifications_read_up_to
+    )
+
+def audience_unread(user):
+    return Notification.unread_for(user).filter(audience=NotificationAudience.ACCOUNT_AGENTS)
+
+def latest_notifications(user):
+    # Direct and account-wide notifications merged in one ordered query.
+    return Notification.visible_to(user).select_related("ticket").order_by("-sent_at")[:notification_cache.LATEST_SIZE]
 
 def notifications_processor(request):
     user = getattr(request, "user", None)
 
     if not user or not getattr(user, "id", None):
-        return {"notifications": [], "unread_count": 0}
+        return {"notifications": [], "unread_count": 0, "notification_stream_enabled": False}
+
+    account_id = Notification.audience_account_for(user)
 
-    qs = NotificationRecipient.objects.filter(
-        user_id=user.id
-    ).select_related(
-        "notification", "notification__ticket"
-    ).order_by("-notification__sent_at")
+    unread_count = notification_cache.get_unread_count(user.id, lambda: direct_unread(user).count())
+    if account_id:
+        unread_count += notification_cache.get_audience_unread_count(
+            user.id,
+            account_id,
+            lambda: audience_unread(user).count()
+        )
 
-    unread_count = qs.filter(is_read=False).count()
-    notifications = qs[:10]
+    notifications = notification_cache.get_latest(
+        user.id,
+        lambda: latest_notifications(user),
+        account_id=account_id
+    )
 
     return {
         "notifications": notifications,
-        "unread_count": unread_count
+        # Coalesced rows move up the -sent_at order, so the first one need not have the highest id.
+        "latest_notification_id": max((notification.id for notification in notifications), default=0),
+        "digest_form": NotificationDigestForm(initial={"notification_digest": user.notification_digest}),
+        "unread_count": unread_count,
+        "notification_stream_enabled": settings.NOTIFICATION_STREAM_ENABLED,
     }
@@ -1,18 +1,15 @@
 from django.shortcuts import redirect
 from django.views import View
-from .models.users import UserType, AppUser
+from .models.users import UserType
 
 class CustomerRequiredMixin(View):
     login_url = "/login/"
 
     def dispatch(self, request, *args, **kwargs):
-        user_id = request.session.get("user_id")
-        account_id = request.session.get("account_id")
-        if not user_id or not account_id:
+        if not request.session.get("account_id"):
             return redirect(self.login_url)
-        try:
-            user = AppUser.objects.get(id=user_id, account_id=account_id)
-        except AppUser.DoesNotExist:
+        user = request.principal
+        if not user:
             return redirect(self.login_url)
         if user.role != UserType.CUSTOMER:
             return redirect(self.login_url)
@@ -24,13 +21,10 @@ class AgentRequiredMixin(View):
     login_url = "/login/"
 
     def dispatch(self, request, *args, **kwargs):
-        user_id = request.session.get("user_id")
-        account_id = request.session.get("account_id")
-        if not user_id or not account_id:
+        if not request.session.get("account_id"):
             return redirect(self.login_url)
-        try:
-            user = AppUser.objects.get(id=user_id, account_id=account_id)
-        except AppUser.DoesNotExist:
+        user = request.principal
+        if not user:
             return redirect(self.login_url)
         if user.role != UserType.AGENT or not user.is_active:
             return redirect(self.login_url)
@@ -43,16 +37,11 @@ class AccountAwareMixin(View):
     login_url = "/login/"
 
     def dispatch(self, request, *args, **kwargs):
-        user_id = request.session.get("user_id")
-
-        if not user_id:
-            return redirect(self.login_url)
-
-        try:
-            request.user = AppUser.objects.get(id=user_id)
-        except AppUser.DoesNotExist:
+        user = request.principal
+        if not user:
             return redirect(self.login_url)
 
+        request.user = user
         return super().dispatch(request, *args, **kwargs)
 
     def filter_queryset_by_account(self, queryset, user_field="creator_id"):
@@ -1,9 +1,57 @@
 from django import forms
-from ..models.tickets import Ticket, TicketPriority, TicketStatus
+from django.forms.models import ModelChoiceIterator
+from ..models.tickets import Ticket, priority_registry, status_registry
 from ..models.users import AppUser, UserType
 from ..utils.status_transition import get_allowed_transitions
 
 
+class RegistryChoiceIterator(ModelChoiceIterator):
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.registry_choices():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.registry_choices()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.registry_choices())
+
+
+class RegistryChoiceField(forms.ModelChoiceField):
+    iterator = RegistryChoiceIterator
+
+    def __init__(self, registry, names=None, **kwargs):
+        self.registry = registry
+        self.names = names
+        super().__init__(queryset=registry.model.objects.all(), **kwargs)
+
+    def registry_choices(self):
+        choices = self.registry.all()
+        if self.names is not None:
+            choices = [obj for obj in choices if getattr(obj, self.registry.name_field) in self.names]
+        return choices
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.registry.model):
+            value = value.pk
+        try:
+            obj = self.registry.by_id(value)
+        except self.registry.model.DoesNotExist:
+            obj = None
+        if obj is None or obj not in self.registry_choices():
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return obj
+
+
 class TicketForm(forms.ModelForm):
 
     DEFAULT_CHOICES = [
@@ -40,10 +88,13 @@ class TicketForm(forms.ModelForm):
             else:
                 field.widget.attrs["class"] = "form-control"
 
-        self.fields["priority_id"].queryset = TicketPriority.objects.all()
-        self.fields["priority_id"].label = "Priority"
-        self.fields["priority_id"].empty_label = None
-        self.fields["priority_id"].required = True
+        self.fields["priority_id"] = RegistryChoiceField(
+            priority_registry,
+            required=True,
+            label="Priority",
+            empty_label=None,
+            widget=forms.Select(attrs={"class": "form-select"})
+        )
 
         self.fields["duration"].choices = [("", "Select Duration")] + self.DEFAULT_CHOICES
         self.fields["duration"].required = False
@@ -126,13 +177,15 @@ class TicketUpdateForm(forms.ModelForm):
         for field in self.fields.values():
             field.widget.attrs["class"] = "form-control"
 
-        self.fields["priority_id"].queryset = TicketPriority.objects.all()
-        self.fields["priority_id"].label = "Priority"
-        self.fields["priority_id"].empty_label = None
-        self.fields["priority_id"].required = True
+        self.fields["priority_id"] = RegistryChoiceField(
+            priority_registry,
+            required=True,
+            label="Priority",
+            empty_label=None,
+            widget=forms.Select(attrs={"class": "form-select"})
+        )
         if self.ticket.priority_id:
             self.fields["priority_id"].initial = self.ticket.priority_id
-        self.fields["priority_id"].widget.attrs.update({"class": "form-select"})
 
         default_choice = ""
         if self.ticket.priority_id and self.ticket.priority_id.duration:
@@ -184,8 +237,9 @@ class TicketUpdateForm(forms.ModelForm):
 
         allowed_statuses = get_allowed_transitions(self.ticket.status.status)
         allowed_statuses.append(self.ticket.status.status)
-        self.fields["status"] = forms.ModelChoiceField(
-            queryset=TicketStatus.objects.filter(status__in=allowed_statuses),
+        self.fields["status"] = RegistryChoiceField(
+            status_registry,
+            names=allowed_statuses,
             initial=self.ticket.status,
             widget=forms.Select(attrs={"class": "form-select"}),
             label="Status",
@@ -0,0 +1,63 @@
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from ..models.tickets import priority_registry, status_registry
+from ..utils.pagination import encode_cursor
+
+
+def _name(registry, pk):
+    return getattr(registry.by_id(pk), registry.name_field) if pk is not None else None
+
+
+# API field -> (model field loaded by .only(), value getter). Getters only
+# touch the loaded column, so a sparse fieldset never triggers extra queries.
+TICKET_FIELDS = {
+    "id": ("id", lambda ticket: ticket.id),
+    "title": ("title", lambda ticket: ticket.title),
+    "description": ("description", lambda ticket: ticket.description),
+    "category": ("ticket_category", lambda ticket: ticket.ticket_category),
+    "status": ("status", lambda ticket: _name(status_registry, ticket.status_id)),
+    "priority": ("priority_id", lambda ticket: _name(priority_registry, ticket.priority_id_id)),
+    "creator_id": ("creator_id", lambda ticket: ticket.creator_id_id),
+    "assignee_id": ("assignee_id", lambda ticket: ticket.assignee_id_id),
+    "start_time": ("start_time", lambda ticket: ticket.start_time),
+    "deadline": ("deadline", lambda ticket: ticket.deadline),
+    "created_at": ("created_at", lambda ticket: ticket.created_at),
+    "changed_at": ("changed_at", lambda ticket: ticket.changed_at),
+}
+DEFAULT_TICKET_FIELDS = ["id", "title", "status", "priority", "category", "assignee_id", "changed_at"]
+# The keyset cursor is built from these, so they are always loaded.
+CURSOR_FIELDS = ["id", "changed_at"]
+
+
+def parse_ticket_fields(value):
+    if not value:
+        return list(DEFAULT_TICKET_FIELDS)
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in TICKET_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}.")
+    return list(dict.fromkeys(fields))
+
+
+def only_columns(fields):
+    return list(dict.fromkeys(CURSOR_FIELDS + [TICKET_FIELDS[field][0] for field in fields]))
+
+
+def ticket_to_dict(ticket, fields):
+    return {field: TICKET_FIELDS[field][1](ticket) for field in fields}
+
+
+def stream_ticket_page(tickets, fields, limit):
+    # Yields {"results": [...], "next_cursor": ...} one ticket at a time;
+    # one row past the limit tells whether another page exists.
+    yield '{"results": ['
+    last = None
+    has_more = False
+    for index, ticket in enumerate(tickets[:limit + 1].iterator(chunk_size=100)):
+        if index == limit:
+            has_more = True
+            break
+        yield ("," if index else "") + json.dumps(ticket_to_dict(ticket, fields), cls=DjangoJSONEncoder)
+        last = ticket
+    next_cursor = encode_cursor(last.changed_at, last.id) if has_more else None
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + "}"
@@ -1,6 +1,10 @@
+from asgiref.sync import sync_to_async
 from django import forms
-from django.contrib.auth.hashers import make_password,check_password
-from ..models.users import AppUser, Account, UserType
+from django.contrib.auth.hashers import make_password
+from django.db.models import Max
+from ..models.notifications import Notification
+from ..models.users import AppUser, Account, DigestFrequency, UserType
+from ..utils import password_pool
 from django.core.exceptions import ValidationError
 
 
@@ -17,18 +21,25 @@ class CustomerSignupForm(forms.Form):
         return portal
 
     def save(self):
-        # called after form.is_valid()
+        # called after form.is_valid(); raises HashingPoolBusy when the hashing pool is saturated
+        return self.create_user(password_pool.hash_password(self.cleaned_data["password"]))
+
+    async def asave(self):
+        # Async counterpart of save() that awaits the hashing pool instead of blocking on it.
+        password_hash = await password_pool.ahash_password(self.cleaned_data["password"])
+        return await sync_to_async(self.create_user)(password_hash)
+
+    def create_user(self, password_hash):
         portal = self.cleaned_data["portal"]
         name = self.cleaned_data["name"]
         email = self.cleaned_data["email"]
-        password = self.cleaned_data["password"]
 
         account = Account.objects.create(portal=portal)
         user = AppUser.objects.create(
             account_id=account,
             name=name,
             email=email,
-            password=make_password(password),
+            password=password_hash,
             role=UserType.CUSTOMER,
         )
         return user
@@ -46,6 +57,8 @@ class AgentCreateForm(forms.ModelForm):
         agent.account_id = customer.account_id
         agent.password = make_password(self.cleaned_data["password"])
         agent.role = UserType.AGENT
+        # New agents start with the account's earlier notifications already read.
+        agent.notifications_read_up_to = Notification.objects.aggregate(latest=Max("id"))["latest"] or 0
         if commit:
             agent.save()
         return agent
@@ -56,11 +69,17 @@ class LoginForm(forms.Form):
     email = forms.EmailField()
     password = forms.CharField(widget=forms.PasswordInput)
 
+    def __init__(self, *args, defer_password_check=False, **kwargs):
+        # With defer_password_check, is_valid() only finds the user and the
+        # caller finishes with averify_password().
+        super().__init__(*args, **kwargs)
+        self.defer_password_check = defer_password_check
+        self.candidate = None
+
     def clean(self):
         cleaned_data = super().clean()
         portal = cleaned_data.get("portal")
         email = cleaned_data.get("email")
-        password = cleaned_data.get("password")
 
         try:
             account = Account.objects.get(portal=portal)
@@ -72,13 +91,44 @@ class LoginForm(forms.Form):
         except AppUser.DoesNotExist:
             raise forms.ValidationError("User does not exist")
 
-        if not check_password(password, user.password):
+        password = cleaned_data.get("password")
+        if password is None:
+            return cleaned_data
+
+        self.candidate = user
+        if not self.defer_password_check:
+            # Raises HashingPoolBusy when the hashing pool is saturated.
+            self.accept_password(*password_pool.verify_password(password, user.password))
+        return cleaned_data
+
+    async def averify_password(self):
+        # Raises HashingPoolBusy when the hashing pool is saturated.
+        valid, upgraded = await password_pool.averify_password(self.cleaned_data["password"], self.candidate.password)
+        try:
+            await sync_to_async(self.accept_password)(valid, upgraded)
+        except ValidationError as error:
+            self.add_error(None, error)
+            return False
+        return True
+
+    def accept_password(self, valid, upgraded):
+        user = self.candidate
+        if not valid:
             raise forms.ValidationError("Incorrect password")
+        if upgraded:
+            user.password = upgraded
+            AppUser.objects.filter(pk=user.pk).update(password=upgraded)
 
         if user.role == UserType.AGENT and not user.is_active:
             raise ValidationError("Your agent account has been deactivated. Contact admin.")
 
         # store user object for view to login
         self.user = user
-        return cleaned_data
 
+
+class NotificationDigestForm(forms.Form):
+    notification_digest = forms.ChoiceField(
+        choices=DigestFrequency.choices,
+        label="Notification delivery",
+        widget=forms.Select(attrs={"class": "form-select form-select-sm"})
+    )
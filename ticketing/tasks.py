@@ -1,61 +1,323 @@
+import logging
+import time
+from datetime import timedelta
 from celery import shared_task
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Max, Min, Q
 from django.utils import timezone
-from .models.tickets import Ticket, TicketStatus, TicketHistory
+from django.utils.dateparse import parse_datetime
+from .models.notifications import Notification, NotificationAudience, NotificationRecipient
+from .models.scheduling import SLATimer, SweepCheckpoint
+from .models.tickets import Ticket, TicketHistory, status_registry
 from .models.users import AppUser
-from .utils.notifications_utils import _create_notification  # use internal function
+from .utils.notifications_utils import (
+    _create_notifications_bulk,
+    fan_out_to_agents,
+    flush_notification_digests,
+)
+from .utils import notification_cache
+from .utils.sla_timers import SLA_TIMED_STATUSES, schedule_deadline_task
+
+logger = logging.getLogger(__name__)
+
+ESCALATION_BATCH_SIZE = 500
+
 
 @shared_task
 def escalate_expired_tickets():
+    # Safety net for ETA tasks that were lost; only reads timers that are due.
+    now = timezone.now()
+    escalated = _escalate_due_tickets(now)
+    SLATimer.objects.filter(due_at__lte=now).exclude(
+        ticket__status__status__in=SLA_TIMED_STATUSES
+    ).delete()
+    return escalated
+
+
+@shared_task
+def escalate_ticket_deadline(ticket_id):
     now = timezone.now()
-    escalated_status = TicketStatus.objects.get(status="Escalated")
+    escalated = _escalate_due_tickets(now, ticket_ids=[ticket_id])
+    if not escalated:
+        timer = SLATimer.objects.filter(ticket_id=ticket_id).first()
+        if timer and timer.due_at > now:
+            # Fired early (clock skew or a rescheduled deadline): wait for the real due time.
+            schedule_deadline_task(ticket_id, timer.due_at)
+    return escalated
+
+
+def escalation_source_statuses():
+    return {
+        status_registry.get(name).pk: name
+        for name in SLA_TIMED_STATUSES
+    }
+
+
+def escalation_batch(now, source_statuses, last_id=0, ticket_ids=None):
+    due = Ticket.objects.filter(
+        sla_timer__due_at__lte=now,
+        deadline__lte=now,
+        status_id__in=source_statuses
+    )
+    if ticket_ids is not None:
+        due = due.filter(id__in=ticket_ids)
+    return (
+        due.filter(id__gt=last_id)
+        .order_by("id")
+        .values("id", "title", "status_id", "creator_id_id", "assignee_id_id")
+        [:ESCALATION_BATCH_SIZE]
+    )
+
+
+def _escalate_due_tickets(now, ticket_ids=None):
+    escalated_status = status_registry.get("Escalated")
+    source_statuses = escalation_source_statuses()
     system_user = AppUser.objects.get(email="system@internal")
 
-    tickets = Ticket.objects.filter(
-        deadline__lt=now,
-        status__status__in=["In-Progress", "Waiting-For-Customer"]
+    escalated = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                escalation_batch(now, source_statuses, last_id, ticket_ids).select_for_update()
+            )
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            escalated += _escalate_chunk(rows, now, escalated_status, source_statuses, system_user)
+
+    return escalated
+
+
+def _escalate_chunk(rows, now, escalated_status, source_statuses, system_user):
+    ids = [row["id"] for row in rows]
+    updated = Ticket.objects.filter(
+        id__in=ids,
+        deadline__lte=now,
+        status_id__in=source_statuses
+    ).update(status=escalated_status, changed_at=now)
+
+    if updated != len(rows):
+        # Some tickets moved on between the read and the guarded UPDATE.
+        confirmed = set(
+            Ticket.objects.filter(id__in=ids, status=escalated_status, changed_at=now)
+            .values_list("id", flat=True)
+        )
+        rows = [row for row in rows if row["id"] in confirmed]
+
+    SLATimer.objects.filter(ticket_id__in=[row["id"] for row in rows]).delete()
+
+    TicketHistory.objects.bulk_create([
+        TicketHistory(
+            ticket_id=row["id"],
+            updated_by=system_user,
+            changes={"status": {"old": source_statuses[row["status_id"]], "new": escalated_status.status}}
+        )
+        for row in rows
+    ])
+
+    _create_notifications_bulk(
+        notifier=system_user,
+        entries=[
+            (
+                row["id"],
+                f"Ticket '{row['title']}' auto escalated from '{source_statuses[row['status_id']]}' to 'Escalated'",
+                [row["creator_id_id"], row["assignee_id_id"]],
+            )
+            for row in rows
+        ],
+        batch_size=ESCALATION_BATCH_SIZE
     )
+    return len(rows)
+
+
+AUTO_CLOSE_BATCH_SIZE = 200
+AUTO_CLOSE_CHECKPOINT = "auto_close_inactive_tickets"
+
 
-    for ticket in tickets:
-        old_status = ticket.status.status
-        ticket.status = escalated_status
-        ticket.save(updated_by=system_user)
-
-        # Create notification
-        recipients = [ticket.creator_id]
-        if ticket.assignee_id:
-            recipients.append(ticket.assignee_id)
-
-        _create_notification(
-            ticket=ticket,
-            notifier=system_user,
-            purpose=f"Ticket '{ticket.title}' auto escalated from '{old_status}' to 'Escalated'",
-            recipients=recipients
+def auto_close_batch(waiting_status, limit, last_changed_at=None, last_id=0):
+    tickets = Ticket.objects.filter(
+        status=waiting_status,
+        changed_at__lt=limit
+    ).select_related("creator_id", "assignee_id").order_by("changed_at", "id")
+    if last_changed_at:
+        tickets = tickets.filter(
+            Q(changed_at__gt=last_changed_at) | Q(changed_at=last_changed_at, id__gt=last_id)
         )
+    return tickets[:AUTO_CLOSE_BATCH_SIZE]
 
 
 @shared_task
 def auto_close_inactive_tickets():
-    limit = timezone.now() - timezone.timedelta(days=1)
-    closed_status = TicketStatus.objects.get(status="Closed")
+    waiting_status = status_registry.get("Waiting-For-Customer")
+    closed_status = status_registry.get("Closed")
     system_user = AppUser.objects.get(email="system@internal")
 
-    tickets = Ticket.objects.filter(
-        status__status="Waiting-For-Customer",
-        changed_at__lt=limit
+    checkpoint, _ = SweepCheckpoint.objects.get_or_create(name=AUTO_CLOSE_CHECKPOINT)
+    cursor = checkpoint.cursor
+    # The cutoff is recomputed on every run. Resuming an interrupted run only
+    # keeps its (changed_at, id) position: everything before it was below the
+    # old cutoff, so a later cutoff can only add tickets after it.
+    limit = timezone.now() - timezone.timedelta(days=1)
+    if cursor.get("changed_at"):
+        last_changed_at = parse_datetime(cursor["changed_at"])
+        last_id = cursor.get("id", 0)
+    else:
+        last_changed_at, last_id = None, 0
+
+    report = {"closed": 0, "chunks": []}
+    while True:
+        started = time.monotonic()
+        with transaction.atomic():
+            chunk = list(auto_close_batch(waiting_status, limit, last_changed_at, last_id))
+            if not chunk:
+                break
+            last_changed_at, last_id = chunk[-1].changed_at, chunk[-1].id
+
+            for ticket in chunk:
+                ticket.status = closed_status
+                ticket.save(updated_by=system_user)
+
+            _create_notifications_bulk(
+                notifier=system_user,
+                entries=[
+                    (
+                        ticket.id,
+                        f"Ticket '{ticket.title}' auto closed due to inactivity",
+                        [ticket.creator_id_id, ticket.assignee_id_id],
+                    )
+                    for ticket in chunk
+                ],
+                batch_size=AUTO_CLOSE_BATCH_SIZE
+            )
+
+            checkpoint.cursor = {
+                "changed_at": last_changed_at.isoformat(),
+                "id": last_id,
+            }
+            checkpoint.save(update_fields=["cursor", "updated_at"])
+
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        report["closed"] += len(chunk)
+        report["chunks"].append({"tickets": len(chunk), "ms": elapsed_ms})
+        logger.info("auto_close_inactive_tickets: closed %s tickets in %sms", len(chunk), elapsed_ms)
+
+    checkpoint.cursor = {}
+    checkpoint.save(update_fields=["cursor", "updated_at"])
+    return report
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def fan_out_notification(self, notification_id, account_id):
+    try:
+        return fan_out_to_agents(notification_id, account_id)
+    except Exception as exc:
+        raise self.retry(exc=exc)
+
+
+@shared_task
+def send_notification_digests():
+    return flush_notification_digests()
+
+
+@shared_task
+def prune_notifications():
+    # Deletes in small notification-id windows with a pause between them, so
+    # SQLite never holds the write lock for long.
+    now = timezone.now()
+    read_cutoff = now - timedelta(days=settings.NOTIFICATION_RETENTION_READ_DAYS)
+    unread_cutoff = now - timedelta(days=settings.NOTIFICATION_RETENTION_UNREAD_DAYS)
+    batch_size = getattr(settings, "NOTIFICATION_PRUNE_BATCH_SIZE", 500)
+    pause = getattr(settings, "NOTIFICATION_PRUNE_PAUSE_SECONDS", 0.2)
+
+    started = time.monotonic()
+    report = {"notifications": 0, "recipients": 0, "batches": 0}
+    bounds = Notification.objects.filter(
+        sent_at__lt=max(read_cutoff, unread_cutoff)
+    ).aggregate(low=Min("id"), high=Max("id"))
+
+    if bounds["low"] is not None:
+        for low in range(bounds["low"], bounds["high"] + 1, batch_size):
+            if report["batches"]:
+                time.sleep(pause)
+            high = low + batch_size
+            with transaction.atomic():
+                pruned = _prune_notification_window(low, high, read_cutoff, unread_cutoff)
+            report["notifications"] += pruned["notifications"]
+            report["recipients"] += pruned["recipients"]
+            report["batches"] += 1
+
+    report["ms"] = round((time.monotonic() - started) * 1000, 1)
+    logger.info(
+        "prune_notifications: removed %s notifications and %s recipient rows in %s batches, %sms",
+        report["notifications"], report["recipients"], report["batches"], report["ms"]
     )
+    return report
 
-    for ticket in tickets:
-        old_status = ticket.status.status
-        ticket.status = closed_status
-        ticket.save(updated_by=system_user)
 
-        recipients = [ticket.creator_id]
-        if ticket.assignee_id:
-            recipients.append(ticket.assignee_id)
+def _prune_notification_window(low, high, read_cutoff, unread_cutoff):
+    recipients = NotificationRecipient.objects.filter(notification_id__gte=low, notification_id__lt=high)
+    notifications = Notification.objects.filter(id__gte=low, id__lt=high)
 
-        _create_notification(
-            ticket=ticket,
-            notifier=system_user,
-            purpose=f"Ticket '{ticket.title}' auto closed due to inactivity",
-            recipients=recipients
-        )
+    # Unread rows that disappear must not linger in cached counters.
+    expired = recipients.filter(notification__sent_at__lt=unread_cutoff)
+    unread_user_ids = set(expired.filter(is_read=False).values_list("user_id", flat=True))
+    audience_account_ids = set(
+        notifications.filter(sent_at__lt=unread_cutoff, audience=NotificationAudience.ACCOUNT_AGENTS)
+        .values_list("audience_account_id", flat=True)
+    )
+
+    removed_recipients, _ = expired.delete()
+    read_rows, _ = recipients.filter(notification__sent_at__lt=read_cutoff).filter(
+        Q(is_read=True) | Q(notification_id__lte=F("user__notifications_read_up_to"))
+    ).delete()
+    removed_recipients += read_rows
+
+    _, removed = notifications.filter(
+        Q(sent_at__lt=unread_cutoff)
+        | Q(sent_at__lt=read_cutoff, audience=NotificationAudience.DIRECT, recipients__isnull=True)
+    ).delete()
+    removed_recipients += removed.get(NotificationRecipient._meta.label, 0)
+
+    def forget():
+        for user_id in unread_user_ids:
+            notification_cache.forget_unread(user_id)
+        for account_id in audience_account_ids:
+            notification_cache.record_audience_notification(account_id)
+    transaction.on_commit(forget)
+
+    return {
+        "notifications": removed.get(Notification._meta.label, 0),
+        "recipients": removed_recipients,
+    }
+
+
+@shared_task
+def optimize_sqlite():
+    # Refreshes planner statistics, returns free pages in small steps and
+    # trims the WAL file. Incremental vacuum only frees pages on databases
+    # created with auto_vacuum=INCREMENTAL (or converted by one full VACUUM).
+    report = {}
+    for alias in connections:
+        connection = connections[alias]
+        # Replicas are overwritten from the primary, so only primaries are tuned.
+        if connection.vendor != "sqlite" or alias in getattr(settings, "DATABASE_REPLICAS", []):
+            continue
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA freelist_count")
+            free_before = cursor.fetchone()[0]
+            cursor.execute("PRAGMA optimize")
+            cursor.execute(f"PRAGMA incremental_vacuum({int(settings.SQLITE_VACUUM_PAGES)})")
+            cursor.fetchall()
+            cursor.execute("PRAGMA freelist_count")
+            free_after = cursor.fetchone()[0]
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            cursor.fetchall()
+        report[alias] = {
+            "pages_freed": free_before - free_after,
+            "ms": round((time.monotonic() - started) * 1000, 1),
+        }
+        logger.info("optimize_sqlite: %s freed %s pages in %sms", alias, report[alias]["pages_freed"], report[alias]["ms"])
+    return report
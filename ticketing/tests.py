@@ -0,0 +1,1054 @@
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.sessions.backends.db import SessionStore
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ticketing import db_router
+from ticketing.db_router import primary_reads
+from ticketing.management.commands.check_query_plans import full_scans, hot_queries
+from ticketing.models.comments import Comment, Thread
+from ticketing.models.notifications import Notification, NotificationDigestEntry, NotificationRecipient, TicketPurpose
+from ticketing.models.scheduling import SLATimer, SweepCheckpoint
+from ticketing.models.tickets import Ticket, TicketHistory, TicketPriority, TicketStatus, priority_registry, status_registry
+from ticketing.middleware import STICKY_SESSION_KEY, replica_routing_middleware
+from ticketing.models.users import Account, AppUser, DigestFrequency, UserType
+from ticketing.serializers.user_form import LoginForm
+from ticketing import tasks
+from ticketing.tasks import auto_close_inactive_tickets, escalate_expired_tickets, escalate_ticket_deadline
+from ticketing.notification_context import notifications_processor
+from ticketing.utils import notification_cache, notification_stream, notifications_utils, principal_cache, search_index, sla_timers
+from ticketing.utils.boards import build_status_board
+from ticketing.utils.ticket_export import export_records
+from ticketing.utils.pagination import decode_datetime_cursor, decode_duration_cursor, encode_cursor
+from ticketing.views.notification_views import NotificationStreamView
+from ticketing.views.user_views import LoginView
+from ticketing.views.ticket_views import ticket_list_queryset
+
+STATUSES = ["TODO", "In-Progress", "Waiting-For-Customer", "Resolved", "Closed", "Escalated"]
+
+
+def create_statuses():
+    TicketStatus.objects.bulk_create([TicketStatus(status=name) for name in STATUSES])
+    # bulk_create sends no signals, so drop the process-wide copy by hand.
+    status_registry.invalidate()
+
+
+def create_user(account, name, role=UserType.CUSTOMER, **fields):
+    return AppUser.objects.create(
+        account_id=account, name=name, email=f"{name.lower()}@example.com", password="x", role=role, **fields
+    )
+
+
+def logged_in_client(user):
+    client = Client()
+    session = client.session
+    session.update({"user_id": user.id, "account_id": user.account_id_id, "role": user.role})
+    session.save()
+    return client
+
+
+def create_ticket(creator, title, priority="Low", status="TODO", **fields):
+    priority, created = TicketPriority.objects.get_or_create(priority=priority, defaults={"duration": timedelta(days=1)})
+    if created:
+        priority_registry.invalidate()
+    return Ticket.objects.create(
+        creator_id=creator,
+        title=title,
+        description="",
+        priority_id=priority,
+        status=status_registry.get(status),
+        ticket_category="Billing",
+        **fields
+    )
+
+
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+
+    def test_hot_queries_use_indexes(self):
+        # Raises CommandError naming every hot query that falls back to a table scan.
+        output = StringIO()
+        call_command("check_query_plans", stdout=output)
+        self.assertNotIn("FULL SCAN", output.getvalue())
+
+    def test_every_hot_query_compiles(self):
+        for name, queryset in hot_queries().items():
+            with self.subTest(name):
+                self.assertTrue(str(queryset.query))
+
+    def test_full_scans(self):
+        plan = [
+            (0, 0, 0, "CO-ROUTINE (subquery-3)"),
+            (1, 0, 0, "SEARCH ticketing_ticket USING INDEX ticket_creator_status_idx (creator_id_id=?)"),
+            (2, 0, 0, "SCAN (subquery-3)"),
+            (3, 0, 0, "SCAN ticketing_notification"),
+            (4, 0, 0, "SCAN ticketing_ticket USING COVERING INDEX ticket_changed_idx"),
+        ]
+        self.assertEqual(
+            full_scans(plan),
+            ["SCAN ticketing_notification", "SCAN ticketing_ticket USING COVERING INDEX ticket_changed_idx"]
+        )
+
+
+class StatusBoardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+
+    def test_invalid_column_is_ignored(self):
+        after = encode_cursor(timezone.now(), 1)
+        for column in ["abc", "99999", "1e3"]:
+            with self.subTest(column=column):
+                columns = build_status_board(Ticket.objects.all(), column=column, after=after)
+                self.assertEqual(len(columns), len(STATUSES))
+
+
+class CursorTests(TestCase):
+
+    def test_duration_cursor_round_trip(self):
+        moment = timezone.now()
+        cursor = encode_cursor(3_600_000_000, moment, 7)
+        self.assertEqual(decode_duration_cursor(cursor), (timedelta(hours=1), moment, 7))
+
+    def test_crafted_cursors_are_rejected(self):
+        moment = timezone.now()
+        for values in [
+            (3_600_000_000, moment, "7"),
+            (3_600_000_000, moment, True),
+            ("1h", moment, 7),
+            (10 ** 30, moment, 7),
+            (3_600_000_000, moment, 2 ** 63),
+            (3_600_000_000, "yesterday", 7),
+        ]:
+            with self.subTest(values=values):
+                with self.assertRaises(ValueError):
+                    decode_duration_cursor(encode_cursor(*values))
+
+    def test_datetime_cursor_rejects_out_of_range_id(self):
+        with self.assertRaises(ValueError):
+            decode_datetime_cursor(encode_cursor(timezone.now(), 2 ** 64))
+
+
+class TicketListFilterTests(TestCase):
+
+    def test_out_of_range_assignee_is_rejected_before_streaming(self):
+        for assignee in ["99999999999999999999", "abc", "1.5"]:
+            with self.subTest(assignee=assignee):
+                with self.assertRaisesMessage(ValueError, "assignee must be a user id or 'none'."):
+                    ticket_list_queryset(Ticket.objects.all(), {"assignee": assignee}, ["id"])
+
+
+class UnreadCounterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fill_is_dropped_when_a_notification_lands_during_rebuild(self):
+        def rebuild():
+            notification_cache.record_new_notifications([1])
+            return 3
+
+        self.assertEqual(notification_cache.get_unread_count(1, rebuild), 3)
+        self.assertEqual(notification_cache.get_unread_count(1, lambda: 4), 4)
+
+    def test_fill_is_dropped_when_counters_are_forgotten_during_rebuild(self):
+        def rebuild():
+            notification_cache.forget_unread(1)
+            return 3
+
+        notification_cache.get_unread_count(1, rebuild)
+        self.assertIsNone(cache.get(notification_cache.unread_key(1)))
+
+    def test_warm_counter_is_incremented(self):
+        notification_cache.get_unread_count(1, lambda: 2)
+        notification_cache.record_new_notifications([1])
+        self.assertEqual(notification_cache.get_unread_count(1, lambda: 0), 3)
+
+
+class LoginFormTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        account = Account.objects.create(portal="acme")
+        cls.user = AppUser.objects.create(
+            account_id=account,
+            name="Customer",
+            email="customer@example.com",
+            password=make_password("secret"),
+            role=UserType.CUSTOMER
+        )
+
+    def test_wrong_password_is_invalid(self):
+        form = LoginForm({"portal": "acme", "email": "customer@example.com", "password": "wrong"})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors(), ["Incorrect password"])
+
+    def test_correct_password_is_valid(self):
+        form = LoginForm({"portal": "acme", "email": "customer@example.com", "password": "secret"})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.user, self.user)
+
+    def test_login_view_awaits_the_hashing_pool(self):
+        self.assertTrue(LoginView.view_is_async)
+        response = self.client.post("/login/", {"portal": "acme", "email": "customer@example.com", "password": "secret"})
+        self.assertRedirects(response, "/", fetch_redirect_response=False)
+        self.assertEqual(self.client.session["user_id"], self.user.id)
+
+    def test_login_view_rejects_wrong_password(self):
+        response = self.client.post("/login/", {"portal": "acme", "email": "customer@example.com", "password": "wrong"})
+        self.assertContains(response, "Incorrect password")
+        self.assertNotIn("user_id", self.client.session)
+
+    def test_signup_view_creates_the_account(self):
+        response = self.client.post(
+            "/signup/", {"portal": "globex", "name": "Owner", "email": "owner@example.com", "password": "secret"}
+        )
+        self.assertRedirects(response, "/", fetch_redirect_response=False)
+        user = AppUser.objects.get(account_id__portal="globex")
+        self.assertTrue(check_password("secret", user.password))
+        self.assertEqual(self.client.session["user_id"], user.id)
+
+    @override_settings(PASSWORD_HASH_MAX_PENDING=0)
+    def test_saturated_hashing_pool_returns_503(self):
+        response = self.client.post("/login/", {"portal": "acme", "email": "customer@example.com", "password": "secret"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertContains(response, "Too many sign-ins right now", status_code=503)
+        self.assertNotIn("user_id", self.client.session)
+
+    @override_settings(PASSWORD_HASH_MAX_PENDING=0)
+    def test_saturated_hashing_pool_rejects_signup_without_creating_it(self):
+        response = self.client.post(
+            "/signup/", {"portal": "globex", "name": "Owner", "email": "owner@example.com", "password": "secret"}
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertFalse(Account.objects.filter(portal="globex").exists())
+
+
+class ExportSinceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        cls.customer = create_user(Account.objects.create(portal="acme"), "Customer")
+        cls.tickets = [create_ticket(cls.customer, f"Ticket {index}") for index in range(3)]
+        cls.since = timezone.now() + timedelta(seconds=1)
+        Ticket.objects.update(changed_at=cls.since - timedelta(days=1))
+
+    def add_comment(self, ticket, created_at):
+        thread = Thread.objects.create(body="comment", commented_by=self.customer)
+        comment = Comment.objects.create(ticket=ticket, thread=thread)
+        Comment.objects.filter(pk=comment.pk).update(created_at=created_at)
+        return thread
+
+    def test_comment_and_reply_activity_is_exported(self):
+        commented, replied, untouched = self.tickets
+        self.add_comment(commented, self.since + timedelta(minutes=1))
+        root = self.add_comment(replied, self.since - timedelta(days=1))
+        Thread.objects.filter(pk=root.pk).update(last_reply_at=self.since + timedelta(minutes=1))
+
+        exported = [record["id"] for record in export_records(Ticket.objects.all(), since=self.since)]
+        self.assertEqual(exported, [commented.id, replied.id])
+
+
+@override_settings(NOTIFICATION_STREAM_ENABLED=True, NOTIFICATION_STREAM_BACKEND="memory")
+class NotificationStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        cls.customer = create_user(Account.objects.create(portal="acme"), "Customer")
+        cls.ticket = create_ticket(cls.customer, "Printer")
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(notification_stream, "_hub", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_stream_receives_published_notification(self):
+        session = SessionStore()
+        await session.aset("user_id", self.customer.id)
+        request = AsyncRequestFactory().get("/notificationnotifications/stream/")
+        request.session = session
+
+        response = await NotificationStreamView.as_view()(request)
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), b"retry: 5000\n\n")
+
+        notification = await Notification.objects.acreate(
+            ticket=self.ticket, notifier=self.customer, purpose=TicketPurpose.Comment
+        )
+        await sync_to_async(notification_stream.publish_notification)(notification, [self.customer.id])
+
+        event = (await anext(events)).decode()
+        self.assertTrue(event.startswith("event: notification\n"))
+        payload = json.loads(event.split("data: ", 1)[1])
+        self.assertEqual(payload["id"], notification.id)
+        self.assertEqual(payload["ticket_id"], self.ticket.id)
+        await events.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_ENABLED=False)
+    def test_nothing_is_published_when_disabled(self):
+        notification = Notification.objects.create(
+            ticket=self.ticket, notifier=self.customer, purpose=TicketPurpose.Comment
+        )
+        with mock.patch.object(notification_stream.InMemoryBackend, "publish") as publish:
+            notification_stream.publish_notification(notification, [self.customer.id])
+        publish.assert_not_called()
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], DATABASE_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.session = SessionStore()
+        self.routed = []
+
+    def view(self, request):
+        # Records where a ticket read goes, then runs it.
+        self.routed.append(Ticket.objects.all().db)
+        with primary_reads():
+            self.routed.append(Ticket.objects.all().db)
+        self.routed.append(SessionStore.get_model_class().objects.all().db)
+        list(Ticket.objects.all())
+        return HttpResponse()
+
+    def send(self, method):
+        request = getattr(RequestFactory(), method)("/")
+        request.session = self.session
+        self.routed = []
+        return replica_routing_middleware(self.view)(request)
+
+    def test_get_reads_from_replica(self):
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            self.send("get")
+        self.assertEqual(self.routed, ["replica", "default", "default"])
+        self.assertEqual(len(replica_queries), 1)
+
+    def test_post_makes_session_read_from_primary_for_sticky_window(self):
+        self.send("post")
+        self.assertEqual(self.routed, ["default", "default", "default"])
+
+        self.send("get")
+        self.assertEqual(self.routed, ["default", "default", "default"])
+
+        self.session[STICKY_SESSION_KEY] -= 5
+        self.send("get")
+        self.assertEqual(self.routed, ["replica", "default", "default"])
+
+    def test_writes_switch_the_request_to_primary(self):
+        token = db_router.route_reads_to("replica")
+        try:
+            self.assertEqual(Ticket.objects.all().db, "replica")
+            self.assertEqual(db_router.ReplicaRouter().db_for_write(Account), "default")
+            self.assertEqual(Ticket.objects.all().db, "default")
+        finally:
+            db_router.reset_reads(token)
+
+    def test_replicator_copies_primary_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            primary, replica = os.path.join(directory, "primary.sqlite3"), os.path.join(directory, "replica.sqlite3")
+            with sqlite3.connect(primary) as connection:
+                connection.execute("CREATE TABLE ticket (title TEXT)")
+                connection.execute("INSERT INTO ticket VALUES ('Printer')")
+            databases = {
+                alias: {"ENGINE": "django.db.backends.sqlite3", "NAME": name}
+                for alias, name in [("primary", primary), ("copy", replica)]
+            }
+            with mock.patch.dict(settings.DATABASES, databases):
+                call_command("replicate_sqlite", source="primary", target="copy", once=True, stdout=StringIO())
+            with sqlite3.connect(replica) as connection:
+                self.assertEqual(connection.execute("SELECT title FROM ticket").fetchall(), [("Printer",)])
+
+
+class BulkOperationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        account = Account.objects.create(portal="acme")
+        cls.customer = create_user(account, "Customer")
+        cls.agent = create_user(account, "Agent", role=UserType.AGENT, job_title="Billing")
+        cls.other_agent = create_user(account, "Other", role=UserType.AGENT, job_title="Support")
+        TicketPriority.objects.create(priority="Zero", duration=timedelta(0))
+        priority_registry.invalidate()
+
+    def setUp(self):
+        cache.clear()
+        self.client = logged_in_client(self.agent)
+        self.now = timezone.now().replace(microsecond=0)
+        patcher = mock.patch("django.utils.timezone.now", return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def bulk(self, operation, value, tickets):
+        response = self.client.post(
+            "/ticket/api/bulk/",
+            json.dumps({"operation": operation, "value": value, "ids": [ticket.id for ticket in tickets]}),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_report_splits_updated_unchanged_and_rejected(self):
+        todo = create_ticket(self.customer, "Todo", assignee_id=self.agent)
+        unassigned = create_ticket(self.customer, "Unassigned")
+        closed = create_ticket(self.customer, "Closed", status="Closed")
+        running = create_ticket(self.customer, "Running", status="In-Progress", assignee_id=self.agent)
+
+        report = self.bulk("transition", "In-Progress", [todo, unassigned, closed, running])
+
+        self.assertEqual(report["updated"], [todo.id])
+        self.assertEqual(report["unchanged"], [running.id])
+        self.assertEqual(report["rejected"], [
+            {"id": unassigned.id, "error": "Ticket must have an assignee before moving to In-Progress."},
+            {"id": closed.id, "error": "Invalid status transition from Closed to In-Progress."},
+        ])
+
+    def test_history_matches_ticket_save(self):
+        for operation, value, change in [
+            ("transition", "In-Progress", lambda ticket: setattr(ticket, "status", status_registry.get("In-Progress"))),
+            ("assign", self.other_agent.id, lambda ticket: setattr(ticket, "assignee_id", self.other_agent)),
+            ("priority", "Zero", lambda ticket: setattr(ticket, "priority_id", priority_registry.get("Zero"))),
+        ]:
+            with self.subTest(operation=operation):
+                bulk_ticket = create_ticket(self.customer, f"Bulk {operation}", assignee_id=self.agent)
+                saved_ticket = create_ticket(self.customer, f"Saved {operation}", assignee_id=self.agent)
+
+                self.bulk(operation, value, [bulk_ticket])
+                saved_ticket = Ticket.objects.get(pk=saved_ticket.pk)
+                change(saved_ticket)
+                saved_ticket.save(updated_by=self.agent)
+
+                self.assertEqual(
+                    list(TicketHistory.objects.filter(ticket=bulk_ticket).values_list("updated_by_id", "changes")),
+                    list(TicketHistory.objects.filter(ticket=saved_ticket).values_list("updated_by_id", "changes"))
+                )
+
+    def test_sla_timers_follow_the_new_deadline(self):
+        timed = create_ticket(self.customer, "Timed", status="Waiting-For-Customer", assignee_id=self.agent)
+        untimed = create_ticket(
+            self.customer, "Untimed", priority="Zero", status="Waiting-For-Customer", assignee_id=self.agent
+        )
+        SLATimer.objects.create(ticket=timed, due_at=self.now)
+        SLATimer.objects.create(ticket=untimed, due_at=self.now)
+
+        self.bulk("transition", "In-Progress", [timed, untimed])
+
+        self.assertEqual(
+            list(SLATimer.objects.values_list("ticket_id", "due_at")),
+            [(timed.id, self.now + timedelta(days=1))]
+        )
+
+        self.bulk("transition", "Resolved", [timed])
+        self.assertFalse(SLATimer.objects.exists())
+
+    @override_settings(NOTIFICATION_COALESCE_SECONDS=0)
+    def test_one_notification_per_affected_user(self):
+        tickets = [create_ticket(self.customer, f"Ticket {index}", assignee_id=self.agent) for index in range(3)]
+
+        self.bulk("assign", self.other_agent.id, tickets)
+
+        for user in [self.customer, self.agent, self.other_agent]:
+            with self.subTest(user=user.name):
+                recipients = NotificationRecipient.objects.filter(user=user).select_related("notification")
+                self.assertEqual(len(recipients), 1)
+                self.assertEqual(recipients[0].notification.event_count, 3)
+
+    def test_digest_users_get_a_pending_entry_instead(self):
+        AppUser.objects.filter(pk=self.customer.pk).update(notification_digest=DigestFrequency.DAILY)
+        tickets = [create_ticket(self.customer, f"Ticket {index}", assignee_id=self.agent) for index in range(2)]
+
+        self.bulk("priority", "Zero", tickets)
+
+        self.assertFalse(NotificationRecipient.objects.filter(user=self.customer).exists())
+        entry = NotificationDigestEntry.objects.get(user=self.customer)
+        self.assertEqual((entry.ticket_id, entry.event_count), (tickets[0].id, 2))
+        self.assertTrue(NotificationRecipient.objects.filter(user=self.agent).exists())
+
+    def test_repeated_bulk_events_coalesce(self):
+        ticket = create_ticket(self.customer, "Ticket", assignee_id=self.agent)
+
+        self.bulk("priority", "Zero", [ticket])
+        self.bulk("priority", "Low", [ticket])
+
+        notifications = Notification.objects.filter(recipients__user=self.customer)
+        self.assertEqual([notification.event_count for notification in notifications], [2])
+
+
+class TicketHistoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        account = Account.objects.create(portal="acme")
+        cls.customer = create_user(account, "Customer")
+        cls.agent = create_user(account, "Agent", role=UserType.AGENT, job_title="Billing")
+        TicketPriority.objects.create(priority="High", duration=timedelta(hours=1))
+        priority_registry.invalidate()
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now().replace(microsecond=0)
+        patcher = mock.patch("django.utils.timezone.now", return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def changes(self, ticket):
+        return list(TicketHistory.objects.filter(ticket=ticket).values_list("updated_by_id", "changes"))
+
+    def test_view_update(self):
+        ticket = create_ticket(self.customer, "Printer")
+
+        logged_in_client(self.customer).post(f"/ticket/{ticket.pk}/update/", {
+            "title": "Scanner",
+            "description": "Out of toner",
+            "priority_id": priority_registry.get("High").id,
+            "status": status_registry.get("TODO").id,
+            "assignee_id": self.agent.id,
+            "ticket_category": "Billing",
+            "duration": "",
+        })
+
+        self.assertEqual(self.changes(ticket), [(self.customer.id, {
+            "title": {"old": "Printer", "new": "Scanner"},
+            "description": {"old": "", "new": "Out of toner"},
+            "priority_id": {"old": "Low", "new": "High"},
+            "assignee_id": {"old": None, "new": "Agent (Billing)"},
+        })])
+
+    def test_status_change(self):
+        ticket = create_ticket(self.customer, "Printer", assignee_id=self.agent)
+
+        logged_in_client(self.agent).post(
+            f"/ticket/{ticket.pk}/update_status/", {"status": status_registry.get("In-Progress").id}
+        )
+
+        self.assertEqual(self.changes(ticket), [(self.agent.id, {
+            "status": {"old": "TODO", "new": "In-Progress"},
+            "start_time": {"old": None, "new": self.now.strftime("%d %b %Y %H:%M:%S")},
+            "deadline": {"old": None, "new": (self.now + timedelta(days=1)).strftime("%d %b %Y %H:%M:%S")},
+        })])
+
+    def test_assignment(self):
+        ticket = create_ticket(self.customer, "Printer")
+
+        logged_in_client(self.agent).post(f"/ticket/{ticket.pk}/assign-to-me/")
+
+        self.assertEqual(self.changes(ticket), [(self.agent.id, {
+            "assignee_id": {"old": None, "new": "Agent (Billing)"},
+        })])
+
+    def test_save_query_counts(self):
+        ticket = create_ticket(self.customer, "Printer")
+        # savepoint, UPDATE, history INSERT, release; a status change also
+        # upserts the SLA timer and a text change rewrites the search row.
+        for expected, change in [
+            (4, lambda ticket: setattr(ticket, "assignee_id", self.agent)),
+            (10, lambda ticket: setattr(ticket, "status", status_registry.get("In-Progress"))),
+            (7, lambda ticket: setattr(ticket, "title", "Scanner")),
+        ]:
+            loaded = Ticket.objects.get(pk=ticket.pk)
+            change(loaded)
+            with self.assertNumQueries(expected):
+                loaded.save(updated_by=self.agent)
+
+    def test_refresh_from_db_retakes_the_snapshot(self):
+        ticket = Ticket.objects.get(pk=create_ticket(self.customer, "Printer").pk)
+        Ticket.objects.filter(pk=ticket.pk).update(title="Scanner")
+
+        ticket.refresh_from_db()
+        ticket.title = "Copier"
+        ticket.save(updated_by=self.agent)
+
+        self.assertEqual(self.changes(ticket), [(self.agent.id, {"title": {"old": "Scanner", "new": "Copier"}})])
+
+    def test_partial_refresh_keeps_unsaved_edits(self):
+        ticket = Ticket.objects.get(pk=create_ticket(self.customer, "Printer").pk)
+        Ticket.objects.filter(pk=ticket.pk).update(description="Out of toner")
+
+        ticket.title = "Scanner"
+        ticket.refresh_from_db(fields=["description"])
+        ticket.save(updated_by=self.agent)
+
+        self.assertEqual(self.changes(ticket), [(self.agent.id, {"title": {"old": "Printer", "new": "Scanner"}})])
+
+
+class EscalationSweepTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        account = Account.objects.create(portal="acme")
+        cls.system = AppUser.objects.create(
+            account_id=account, name="System", email="system@internal", password="x", role=UserType.SYSTEM
+        )
+        cls.customer = create_user(account, "Customer")
+        cls.agent = create_user(account, "Agent", role=UserType.AGENT, job_title="Billing")
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now().replace(microsecond=0)
+        patcher = mock.patch("django.utils.timezone.now", return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def overdue_ticket(self, title, status):
+        ticket = create_ticket(self.customer, title, status=status, assignee_id=self.agent)
+        deadline = self.now - timedelta(minutes=1)
+        Ticket.objects.filter(pk=ticket.pk).update(deadline=deadline)
+        SLATimer.objects.update_or_create(ticket=ticket, defaults={"due_at": deadline})
+        return ticket
+
+    def test_sweep_matches_per_ticket_save(self):
+        running = self.overdue_ticket("Running", "In-Progress")
+        waiting = self.overdue_ticket("Waiting", "Waiting-For-Customer")
+        on_time = create_ticket(self.customer, "On time", status="In-Progress", assignee_id=self.agent)
+        # The per-ticket path the sweep replaced.
+        saved = Ticket.objects.get(pk=self.overdue_ticket("Saved", "In-Progress").pk)
+        saved.status = status_registry.get("Escalated")
+        saved.save(updated_by=self.system)
+
+        self.assertEqual(escalate_expired_tickets(), 2)
+
+        for ticket, old_status in [(running, "In-Progress"), (waiting, "Waiting-For-Customer")]:
+            with self.subTest(ticket=ticket.title):
+                ticket.refresh_from_db()
+                self.assertEqual(ticket.status.status, "Escalated")
+                self.assertEqual(ticket.changed_at, self.now)
+                self.assertFalse(SLATimer.objects.filter(ticket=ticket).exists())
+                self.assertEqual(
+                    list(TicketHistory.objects.filter(ticket=ticket).values_list("updated_by_id", "changes")),
+                    [(self.system.id, {"status": {"old": old_status, "new": "Escalated"}})]
+                )
+                notification = Notification.objects.get(ticket=ticket)
+                self.assertEqual(notification.notifier_id, self.system.id)
+                self.assertEqual(
+                    notification.purpose, f"Ticket '{ticket.title}' auto escalated from '{old_status}' to 'Escalated'"
+                )
+                self.assertEqual(
+                    set(notification.recipients.values_list("user_id", flat=True)), {self.customer.id, self.agent.id}
+                )
+
+        self.assertEqual(
+            TicketHistory.objects.get(ticket=running).changes, TicketHistory.objects.get(ticket=saved).changes
+        )
+        on_time.refresh_from_db()
+        self.assertEqual(on_time.status.status, "In-Progress")
+        self.assertTrue(SLATimer.objects.filter(ticket=on_time).exists())
+
+
+@override_settings(NOTIFICATION_AUDIENCE_DELIVERY="write", NOTIFICATION_FANOUT_EAGER=True)
+class AgentFanOutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        account = Account.objects.create(portal="acme")
+        cls.customer = create_user(account, "Customer")
+        cls.agents = [create_user(account, f"Agent{index}", role=UserType.AGENT) for index in range(5)]
+        create_user(account, "Retired", role=UserType.AGENT, is_active=False)
+        create_user(Account.objects.create(portal="other"), "Outsider", role=UserType.AGENT)
+        cls.ticket = create_ticket(cls.customer, "Printer")
+
+    def setUp(self):
+        cache.clear()
+
+    def recipients(self):
+        return sorted(NotificationRecipient.objects.values_list("user_id", flat=True))
+
+    def test_eager_fan_out_reaches_every_active_agent_of_the_account(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications_utils.notify_ticket_created(self.ticket, self.customer)
+
+        self.assertEqual(self.recipients(), sorted([self.customer.id] + [agent.id for agent in self.agents]))
+
+    def test_rerunning_an_interrupted_fan_out_adds_no_duplicates(self):
+        notification = Notification.objects.create(
+            ticket=self.ticket, notifier=self.customer, purpose=TicketPurpose.Ticket_Created
+        )
+        deliver = notifications_utils._deliver_batch
+        calls = []
+
+        def deliver_then_fail(notification, user_ids):
+            calls.append(user_ids)
+            if len(calls) == 2:
+                raise RuntimeError("worker lost")
+            return deliver(notification, user_ids)
+
+        with mock.patch.object(notifications_utils, "_deliver_batch", side_effect=deliver_then_fail):
+            with self.assertRaises(RuntimeError):
+                notifications_utils.fan_out_to_agents(notification.id, self.customer.account_id_id, batch_size=2)
+        self.assertEqual(len(self.recipients()), 2)
+
+        delivered = notifications_utils.fan_out_to_agents(notification.id, self.customer.account_id_id, batch_size=2)
+
+        self.assertEqual(delivered, 3)
+        self.assertEqual(self.recipients(), [agent.id for agent in self.agents])
+
+
+@override_settings(NOTIFICATION_AUDIENCE_DELIVERY="read", NOTIFICATION_COALESCE_SECONDS=0)
+class AudienceNotificationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        account = Account.objects.create(portal="acme")
+        cls.customer = create_user(account, "Customer")
+        cls.agent = create_user(account, "Agent", role=UserType.AGENT, job_title="Billing")
+        cls.unassigned = create_ticket(cls.customer, "Unassigned")
+        cls.assigned = create_ticket(cls.customer, "Assigned", assignee_id=cls.agent)
+
+    def setUp(self):
+        cache.clear()
+
+    def context_for(self, user):
+        request = RequestFactory().get("/")
+        request.user = AppUser.objects.get(pk=user.pk)
+        return notifications_processor(request)
+
+    def test_audience_and_direct_notifications_are_merged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications_utils.notify_ticket_created(self.unassigned, self.customer)
+            notifications_utils.notify_ticket_assigned(self.assigned, self.customer)
+
+        # One audience row for the whole account, recipient rows only for direct notifications.
+        audience = Notification.objects.get(ticket=self.unassigned)
+        self.assertEqual(audience.audience_account_id, self.customer.account_id_id)
+        self.assertFalse(NotificationRecipient.objects.filter(user=self.agent, notification=audience).exists())
+
+        context = self.context_for(self.agent)
+        self.assertEqual(context["unread_count"], 2)
+        self.assertEqual(
+            {notification.ticket_id for notification in context["notifications"]},
+            {self.unassigned.id, self.assigned.id}
+        )
+        self.assertEqual(self.context_for(self.customer)["unread_count"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications_utils.notify_comment_added(
+                Comment.objects.create(
+                    ticket=self.unassigned,
+                    thread=Thread.objects.create(body="Any update?", commented_by=self.customer)
+                ),
+                self.customer
+            )
+        self.assertEqual(self.context_for(self.agent)["unread_count"], 3)
+
+    def test_reading_an_audience_notification_only_affects_that_agent(self):
+        other = create_user(self.customer.account_id, "Other", role=UserType.AGENT)
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications_utils.notify_ticket_created(self.unassigned, self.customer)
+        notification = Notification.objects.get(ticket=self.unassigned)
+
+        response = logged_in_client(self.agent).post(f"/notificationnotifications/{notification.id}/read/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.context_for(self.agent)["unread_count"], 0)
+        self.assertEqual(self.context_for(other)["unread_count"], 1)
+
+
+class PrincipalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        account = Account.objects.create(portal="acme")
+        cls.customer = create_user(account, "Customer")
+        cls.agent = create_user(account, "Agent", role=UserType.AGENT, job_title="Billing")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stacked_mixins_resolve_the_user_once(self):
+        # CustomerDashboardPageView runs CustomerRequiredMixin and AccountAwareMixin.
+        with mock.patch.object(principal_cache, "get_user", wraps=principal_cache.get_user) as get_user:
+            response = logged_in_client(self.customer).get("/")
+        self.assertEqual(response.status_code, 200)
+        get_user.assert_called_once_with(self.customer.id)
+
+    def test_function_view_uses_the_request_principal(self):
+        ticket = create_ticket(self.customer, "Printer")
+        with mock.patch.object(principal_cache, "get_user", wraps=principal_cache.get_user) as get_user:
+            logged_in_client(self.agent).post(f"/ticket/{ticket.pk}/assign-to-me/")
+        get_user.assert_called_once_with(self.agent.id)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.assignee_id_id, self.agent.id)
+
+    def test_missing_principal_redirects_to_login(self):
+        client = logged_in_client(self.customer)
+        AppUser.objects.filter(pk=self.customer.pk).delete()
+        principal_cache.bump_version(self.customer.pk)
+        self.assertRedirects(client.get("/"), "/login/", fetch_redirect_response=False)
+
+
+class SearchIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        cls.customer = create_user(Account.objects.create(portal="acme"), "Customer")
+        cls.other = create_user(Account.objects.create(portal="globex"), "Other")
+
+    def hits(self, user, text):
+        return sorted((hit["kind"], hit["ticket_id"]) for hit in search_index.search(user.account_id_id, text))
+
+    def comment(self, ticket, body):
+        thread = Thread.objects.create(body=body, commented_by=self.customer)
+        Comment.objects.create(ticket=ticket, thread=thread)
+        return thread
+
+    def test_search_is_scoped_to_the_account(self):
+        ticket = create_ticket(self.customer, "Printer jammed")
+        other = create_ticket(self.other, "Printer on fire")
+        self.assertEqual(self.hits(self.customer, "printer"), [("ticket", ticket.pk)])
+        self.assertEqual(self.hits(self.other, "printer"), [("ticket", other.pk)])
+
+    def test_fts_syntax_in_the_query_is_neutralised(self):
+        ticket = create_ticket(self.customer, "Printer jammed")
+        create_ticket(self.other, "Printer on fire")
+        self.assertEqual(self.hits(self.customer, 'printer" OR account : a*'), [])
+        self.assertEqual(self.hits(self.customer, "printer OR fire"), [])
+        self.assertEqual(self.hits(self.customer, "NEAR(printer) -jammed ^"), [])
+        self.assertEqual(self.hits(self.customer, '"printer'), [("ticket", ticket.pk)])
+        self.assertEqual(self.hits(self.customer, "*()"), [])
+
+    def test_ticket_save_and_delete_update_the_index(self):
+        ticket = create_ticket(self.customer, "Printer jammed")
+        ticket.title = "Scanner jammed"
+        ticket.save()
+        self.assertEqual(self.hits(self.customer, "printer"), [])
+        self.assertEqual(self.hits(self.customer, "scanner"), [("ticket", ticket.pk)])
+
+        self.comment(ticket, "Scanner still broken")
+        ticket_id = ticket.pk
+        ticket.delete()
+        self.assertEqual(self.hits(self.customer, "scanner"), [])
+        with connections["default"].cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {search_index.TABLE} WHERE ticket = %s", [f"t{ticket_id}"])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_thread_save_and_delete_update_the_index(self):
+        ticket = create_ticket(self.customer, "Printer jammed")
+        root = self.comment(ticket, "Toner is empty")
+        reply = Thread.objects.create(thread_group=root.thread_group, body="Cartridge replaced", commented_by=self.customer)
+        self.assertEqual(self.hits(self.customer, "toner"), [("comment", ticket.pk)])
+        self.assertEqual(self.hits(self.customer, "cartridge"), [("comment", ticket.pk)])
+
+        reply.body = "Drum replaced"
+        reply.save()
+        self.assertEqual(self.hits(self.customer, "cartridge"), [])
+        self.assertEqual(self.hits(self.customer, "drum"), [("comment", ticket.pk)])
+
+        reply.delete()
+        self.assertEqual(self.hits(self.customer, "drum"), [])
+        self.assertEqual(self.hits(self.customer, "toner"), [("comment", ticket.pk)])
+
+    def test_failed_rebuild_keeps_the_existing_index(self):
+        ticket = create_ticket(self.customer, "Printer jammed")
+        with mock.patch.object(search_index, "REBUILD_TICKETS", "INSERT INTO missing_table VALUES (1)"):
+            with self.assertRaises(Exception):
+                search_index.rebuild_index()
+        self.assertEqual(self.hits(self.customer, "printer"), [("ticket", ticket.pk)])
+        self.assertEqual(search_index.rebuild_index(), 1)
+
+
+@override_settings(SLA_MAX_ETA_SECONDS=3600)
+class SLATimerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        account = Account.objects.create(portal="acme")
+        AppUser.objects.create(
+            account_id=account, name="System", email="system@internal", password="x", role=UserType.SYSTEM
+        )
+        cls.customer = create_user(account, "Customer")
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now().replace(microsecond=0)
+        clock = mock.patch("django.utils.timezone.now", return_value=self.now)
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+        app = mock.patch.object(sla_timers, "current_app")
+        self.send_task = app.start().send_task
+        self.addCleanup(app.stop)
+
+    def scheduled(self):
+        return [(call.kwargs["args"], call.kwargs["eta"]) for call in self.send_task.call_args_list]
+
+    def test_deadline_within_the_cap_is_scheduled_at_the_deadline(self):
+        with override_settings(SLA_MAX_ETA_SECONDS=2 * 24 * 3600), self.captureOnCommitCallbacks(execute=True):
+            ticket = create_ticket(self.customer, "Printer", status="In-Progress")
+        self.assertEqual(ticket.deadline, self.now + timedelta(days=1))
+        self.assertEqual(SLATimer.objects.get(ticket=ticket).due_at, ticket.deadline)
+        self.assertEqual(self.scheduled(), [([ticket.pk], ticket.deadline)])
+
+    def test_deadline_past_the_cap_is_rechecked_at_the_cap(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = create_ticket(self.customer, "Printer", status="In-Progress")
+        self.assertEqual(self.scheduled(), [([ticket.pk], self.now + timedelta(hours=1))])
+
+    def test_changed_deadline_is_rescheduled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = create_ticket(self.customer, "Printer", status="In-Progress")
+        self.send_task.reset_mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.title = "Printer jammed"
+            ticket.save()
+        self.assertEqual(self.scheduled(), [])
+
+        deadline = self.now + timedelta(minutes=30)
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.deadline = deadline
+            ticket.save()
+        self.assertEqual(SLATimer.objects.get(ticket=ticket).due_at, deadline)
+        self.assertEqual(self.scheduled(), [([ticket.pk], deadline)])
+
+    def test_early_fire_rearms_until_the_deadline(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = create_ticket(self.customer, "Printer", status="In-Progress")
+        self.send_task.reset_mock()
+
+        # The re-check scheduled at the cap fires with the deadline still ahead.
+        later = self.now + timedelta(hours=1)
+        self.clock.return_value = later
+        self.assertEqual(escalate_ticket_deadline(ticket.pk), 0)
+        self.assertEqual(self.scheduled(), [([ticket.pk], later + timedelta(hours=1))])
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status.status, "In-Progress")
+
+        self.send_task.reset_mock()
+        self.clock.return_value = ticket.deadline + timedelta(minutes=1)
+        self.assertEqual(escalate_ticket_deadline(ticket.pk), 1)
+        self.assertEqual(self.scheduled(), [])
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status.status, "Escalated")
+        self.assertFalse(SLATimer.objects.filter(ticket=ticket).exists())
+
+
+class ThreadRepliesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        account = Account.objects.create(portal="acme")
+        cls.customer = create_user(account, "Customer")
+        cls.agent = create_user(account, "Agent", role=UserType.AGENT, job_title="Billing")
+        cls.outsider = create_user(Account.objects.create(portal="globex"), "Outsider")
+        cls.ticket = create_ticket(cls.customer, "Printer")
+        cls.root = Thread.objects.create(body="Toner is empty", commented_by=cls.customer)
+        Comment.objects.create(ticket=cls.ticket, thread=cls.root)
+
+    def setUp(self):
+        cache.clear()
+        client = logged_in_client(self.agent)
+        for body in ["Cartridge ordered", "Cartridge replaced"]:
+            client.post(f"/ticket/comment/{self.root.pk}/reply/", {"reply": body})
+
+    def test_detail_page_renders_root_threads_with_reply_count(self):
+        response = logged_in_client(self.customer).get(f"/ticket/{self.ticket.pk}/")
+        self.assertContains(response, "Toner is empty")
+        self.assertContains(response, "2 replies")
+        self.assertContains(response, f'data-url="/ticket/comment/{self.root.pk}/replies/"')
+        self.assertNotContains(response, '<p class="mb-1">Cartridge')
+
+    def test_replies_are_loaded_on_demand(self):
+        response = logged_in_client(self.customer).get(f"/ticket/comment/{self.root.pk}/replies/")
+        content = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(content.index("Cartridge ordered"), content.index("Cartridge replaced"))
+        self.assertEqual(content.count("Agent ·"), 2)
+        self.assertNotIn("Toner is empty", content)
+
+    def test_replies_are_scoped_to_the_account(self):
+        response = logged_in_client(self.outsider).get(f"/ticket/comment/{self.root.pk}/replies/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_reply_thread_has_no_replies_endpoint(self):
+        reply = self.root.replies.first()
+        response = logged_in_client(self.customer).get(f"/ticket/comment/{reply.pk}/replies/")
+        self.assertEqual(response.status_code, 404)
+
+
+class AutoCloseCheckpointTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_statuses()
+        account = Account.objects.create(portal="acme")
+        AppUser.objects.create(
+            account_id=account, name="System", email="system@internal", password="x", role=UserType.SYSTEM
+        )
+        cls.customer = create_user(account, "Customer")
+
+    def setUp(self):
+        cache.clear()
+        base = timezone.now() - timedelta(days=3)
+        # The second and third tickets share changed_at, so the chunk boundary
+        # falls inside a tie and the resume depends on the id in the checkpoint.
+        offsets = [0, 1, 1, 2, 3]
+        self.tickets = []
+        for index, hours in enumerate(offsets):
+            ticket = create_ticket(self.customer, f"Stale {index}", status="Waiting-For-Customer")
+            Ticket.objects.filter(pk=ticket.pk).update(changed_at=base + timedelta(hours=hours))
+            self.tickets.append(Ticket.objects.get(pk=ticket.pk))
+
+    def statuses(self):
+        return [Ticket.objects.get(pk=ticket.pk).status.status for ticket in self.tickets]
+
+    @mock.patch.object(tasks, "AUTO_CLOSE_BATCH_SIZE", 2)
+    def test_interrupted_sweep_resumes_from_the_checkpoint(self):
+        create_bulk = notifications_utils._create_notifications_bulk
+        calls = []
+
+        def interrupt_second_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("worker lost")
+            return create_bulk(*args, **kwargs)
+
+        with mock.patch.object(tasks, "_create_notifications_bulk", side_effect=interrupt_second_chunk):
+            with self.assertRaises(RuntimeError):
+                auto_close_inactive_tickets()
+
+        first_chunk_end = self.tickets[1]
+        self.assertEqual(self.statuses(), ["Closed", "Closed"] + ["Waiting-For-Customer"] * 3)
+        self.assertEqual(
+            SweepCheckpoint.objects.get(name=tasks.AUTO_CLOSE_CHECKPOINT).cursor,
+            {"changed_at": first_chunk_end.changed_at.isoformat(), "id": first_chunk_end.id}
+        )
+
+        with mock.patch.object(tasks, "auto_close_batch", wraps=tasks.auto_close_batch) as batch:
+            report = auto_close_inactive_tickets()
+
+        self.assertEqual(batch.call_args_list[0].args[2:], (first_chunk_end.changed_at, first_chunk_end.id))
+        self.assertEqual(report["closed"], 3)
+        self.assertEqual(self.statuses(), ["Closed"] * 5)
+        for ticket in self.tickets:
+            with self.subTest(ticket=ticket.title):
+                self.assertEqual(TicketHistory.objects.filter(ticket=ticket).count(), 1)
+                self.assertEqual(Notification.objects.filter(ticket=ticket).count(), 1)
+        self.assertEqual(SweepCheckpoint.objects.get(name=tasks.AUTO_CLOSE_CHECKPOINT).cursor, {})
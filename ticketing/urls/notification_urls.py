@@ -1,4 +1,5 @@
-from ..views.notification_views import MarkNotificationsReadView
+from ..views.notification_views import MarkNotificationsReadView, MarkNotificationReadView, NotificationPreferencesView, NotificationStreamView
+from django.conf import settings
 from django.urls import path
 
 urlpatterns = [
@@ -7,4 +8,21 @@ urlpatterns = [
         MarkNotificationsReadView.as_view(),
         name="mark_notifications_read"
     ),
+    path(
+        "notifications/<int:notification_id>/read/",
+        MarkNotificationReadView.as_view(),
+        name="mark_notification_read"
+    ),
+    path(
+        "notifications/preferences/",
+        NotificationPreferencesView.as_view(),
+        name="notification_preferences"
+    ),
 ]
+
+if settings.NOTIFICATION_STREAM_ENABLED:
+    urlpatterns.append(path(
+        "notifications/stream/",
+        NotificationStreamView.as_view(),
+        name="notification_stream"
+    ))
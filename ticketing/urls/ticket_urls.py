@@ -1,11 +1,16 @@
 from django.urls import path
-from ..views.ticket_views import CustomerTicketCreateView, TicketUpdateView, Assign_ticket, TicketDetailView,UpdateTicketStatusView,ReplyCommentView
+from ..views.ticket_views import CustomerTicketCreateView, TicketUpdateView, Assign_ticket, TicketDetailView,UpdateTicketStatusView,ReplyCommentView,ThreadRepliesView,TicketSearchView,TicketListApiView,TicketBulkApiView,TicketExportView
 
 urlpatterns = [
     path("new/", CustomerTicketCreateView.as_view(), name="create-ticket"),
+    path("search/", TicketSearchView.as_view(), name="ticket_search"),
+    path("api/", TicketListApiView.as_view(), name="ticket_api_list"),
+    path("api/bulk/", TicketBulkApiView.as_view(), name="ticket_api_bulk"),
+    path("export/", TicketExportView.as_view(), name="ticket_export"),
     path('<int:pk>/update/', TicketUpdateView.as_view(), name='ticket_update'),
     path("<int:pk>/assign-to-me/", Assign_ticket, name="assign_ticket_to_me"),
     path("<int:pk>/", TicketDetailView.as_view(), name="ticket_detail"),
     path("<int:pk>/update_status/", UpdateTicketStatusView.as_view(), name="update_ticket_status"),
     path("comment/<int:thread_id>/reply/", ReplyCommentView.as_view(), name="reply_comment"),
+    path("comment/<int:thread_id>/replies/", ThreadRepliesView.as_view(), name="thread_replies"),
 ]
@@ -0,0 +1,60 @@
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from ..models.tickets import status_registry
+from .pagination import decode_datetime_cursor, encode_cursor, keyset_after
+
+BOARD_COLUMN_LIMIT = 20
+
+
+def build_status_board(tickets, column=None, after=None, limit=BOARD_COLUMN_LIMIT):
+    # One ranked query for the first `limit` cards of every status column,
+    # plus one aggregate for the column counts. `column`/`after` page a
+    # single column forward with a (changed_at, id) cursor.
+    counts = dict(board_counts(tickets))
+
+    by_status = {}
+    for ticket in board_cards(tickets, column, after, limit):
+        by_status.setdefault(ticket.status_id, []).append(ticket)
+
+    columns = []
+    for status in status_registry.all():
+        column_cards = by_status.get(status.pk, [])
+        next_cursor = None
+        if len(column_cards) > limit:
+            column_cards = column_cards[:limit]
+            last = column_cards[-1]
+            next_cursor = encode_cursor(last.changed_at, last.pk)
+        columns.append({
+            "status": status,
+            "tickets": column_cards,
+            "count": counts.get(status.pk, 0),
+            "next_cursor": next_cursor,
+        })
+    return columns
+
+
+def board_counts(tickets):
+    return tickets.order_by().values_list("status_id").annotate(total=Count("id")).values_list("status_id", "total")
+
+
+def board_cards(tickets, column=None, after=None, limit=BOARD_COLUMN_LIMIT):
+    cards = tickets.order_by()
+    if column and after:
+        try:
+            column = status_registry.by_id(column).pk
+            changed_at, pk = decode_datetime_cursor(after)
+        except (ValueError, status_registry.model.DoesNotExist):
+            pass
+        else:
+            cards = cards.filter(
+                ~Q(status_id=column)
+                | Q(status_id=column) & keyset_after("changed_at", changed_at, pk, descending=True)
+            )
+
+    return cards.annotate(
+        board_rank=Window(
+            RowNumber(),
+            partition_by=[F("status_id")],
+            order_by=[F("changed_at").desc(), F("id").desc()]
+        )
+    ).filter(board_rank__lte=limit + 1).order_by("status_id", "board_rank")
@@ -0,0 +1,276 @@
+from django.db import transaction
+from django.utils import timezone
+from ..models.scheduling import SLATimer
+from ..models.tickets import Ticket, TicketHistory, priority_registry, status_registry
+from ..models.users import AppUser, UserType
+from .notifications_utils import _create_notifications_bulk
+from .sla_timers import SLA_TIMED_STATUSES, schedule_deadline_task
+from .sqlite_retry import run_with_retry
+from .status_transition import get_allowed_transitions
+
+BULK_MAX_TICKETS = 5000
+BULK_CHUNK_SIZE = 500
+
+ROW_FIELDS = ["id", "title", "status_id", "priority_id_id", "assignee_id_id", "creator_id_id", "start_time", "deadline"]
+
+
+def _format_time(value):
+    return value.strftime("%d %b %Y %H:%M:%S") if value else None
+
+
+def _agent_display(agent):
+    return f"{agent.name} ({agent.job_title})" if agent else None
+
+
+def parse_ticket_ids(values):
+    if not isinstance(values, list) or not values:
+        raise ValueError("ids must be a non-empty list of ticket ids.")
+    try:
+        ids = list(dict.fromkeys(int(value) for value in values))
+    except (TypeError, ValueError):
+        raise ValueError("ids must be integers.")
+    if len(ids) > BULK_MAX_TICKETS:
+        raise ValueError(f"At most {BULK_MAX_TICKETS} tickets per request.")
+    return ids
+
+
+class BulkOperation:
+    # Validates every row in memory, then applies one UPDATE per group of
+    # tickets that receive identical column values.
+
+    def __init__(self, actor, value):
+        self.actor = actor
+
+    def check(self, row):
+        return None
+
+    def prepare(self, rows):
+        pass
+
+    def is_noop(self, row):
+        return False
+
+    def group_key(self, row):
+        return None
+
+    def values(self, key, now):
+        raise NotImplementedError
+
+    def changes(self, row, values):
+        raise NotImplementedError
+
+    def purpose(self, count):
+        raise NotImplementedError
+
+    def after_update(self, rows, now):
+        pass
+
+
+class AssignOperation(BulkOperation):
+
+    def __init__(self, actor, value):
+        super().__init__(actor, value)
+        try:
+            agent_id = actor.id if value == "me" else int(value)
+        except (TypeError, ValueError):
+            raise ValueError("value must be an agent id or 'me'.")
+        self.agent = AppUser.objects.filter(
+            id=agent_id,
+            role=UserType.AGENT,
+            is_active=True,
+            account_id=actor.account_id_id
+        ).first()
+        if self.agent is None:
+            raise ValueError(f"No active agent {value!r} in this account.")
+        self.old_agents = {}
+
+    def is_noop(self, row):
+        return row["assignee_id_id"] == self.agent.id
+
+    def values(self, key, now):
+        return {"assignee_id": self.agent}
+
+    def prepare(self, rows):
+        old_ids = {row["assignee_id_id"] for row in rows if row["assignee_id_id"]}
+        self.old_agents = AppUser.objects.in_bulk(old_ids) if old_ids else {}
+
+    def changes(self, row, values):
+        return {"assignee_id": {
+            "old": _agent_display(self.old_agents.get(row["assignee_id_id"])),
+            "new": _agent_display(self.agent),
+        }}
+
+    def purpose(self, count):
+        return f"{self.actor.name} assigned {count} ticket(s) to {self.agent.name}"
+
+
+class PriorityOperation(BulkOperation):
+
+    def __init__(self, actor, value):
+        super().__init__(actor, value)
+        self.priority = priority_registry.get(value)
+
+    def is_noop(self, row):
+        return row["priority_id_id"] == self.priority.id
+
+    def values(self, key, now):
+        return {"priority_id": self.priority}
+
+    def changes(self, row, values):
+        return {"priority_id": {
+            "old": priority_registry.by_id(row["priority_id_id"]).priority,
+            "new": self.priority.priority,
+        }}
+
+    def purpose(self, count):
+        return f"{self.actor.name} changed the priority of {count} ticket(s) to '{self.priority.priority}'"
+
+
+class TransitionOperation(BulkOperation):
+
+    def __init__(self, actor, value):
+        super().__init__(actor, value)
+        self.status = status_registry.get(value)
+        self.starts_clock = self.status.status == "In-Progress"
+
+    def check(self, row):
+        current = status_registry.by_id(row["status_id"]).status
+        if self.status.status not in get_allowed_transitions(current) + [current]:
+            return f"Invalid status transition from {current} to {self.status.status}."
+        if self.starts_clock and not row["assignee_id_id"]:
+            return "Ticket must have an assignee before moving to In-Progress."
+        return None
+
+    def is_noop(self, row):
+        return row["status_id"] == self.status.id
+
+    def group_key(self, row):
+        # Entering In-Progress restarts the SLA clock from the ticket's own priority.
+        return row["priority_id_id"] if self.starts_clock else None
+
+    def values(self, key, now):
+        values = {"status": self.status}
+        if self.starts_clock:
+            duration = priority_registry.by_id(key).duration if key else None
+            values.update(start_time=now, deadline=now + duration if duration else None)
+        return values
+
+    def changes(self, row, values):
+        changes = {"status": {
+            "old": status_registry.by_id(row["status_id"]).status,
+            "new": self.status.status,
+        }}
+        for field in ["start_time", "deadline"]:
+            if field in values and values[field] != row[field]:
+                changes[field] = {"old": _format_time(row[field]), "new": _format_time(values[field])}
+        return changes
+
+    def purpose(self, count):
+        return f"{self.actor.name} moved {count} ticket(s) to '{self.status.status}'"
+
+    def after_update(self, rows, now):
+        ids = [row["id"] for row in rows]
+        if self.status.status not in SLA_TIMED_STATUSES:
+            SLATimer.objects.filter(ticket_id__in=ids).delete()
+            return
+        if not self.starts_clock:
+            return
+
+        timed = dict(Ticket.objects.filter(id__in=ids, deadline__isnull=False).values_list("id", "deadline"))
+        # A priority without a duration clears the deadline, and with it the timer (as sync_sla_timer does).
+        SLATimer.objects.filter(ticket_id__in=[ticket_id for ticket_id in ids if ticket_id not in timed]).delete()
+        timers = [SLATimer(ticket_id=ticket_id, due_at=deadline) for ticket_id, deadline in timed.items()]
+        SLATimer.objects.bulk_create(
+            timers,
+            update_conflicts=True,
+            unique_fields=["ticket"],
+            update_fields=["due_at"]
+        )
+        transaction.on_commit(lambda: [schedule_deadline_task(timer.ticket_id, timer.due_at) for timer in timers])
+
+
+OPERATION_CLASSES = {
+    "assign": AssignOperation,
+    "priority": PriorityOperation,
+    "transition": TransitionOperation,
+}
+
+
+def build_operation(actor, name, value):
+    if name not in OPERATION_CLASSES:
+        raise ValueError(f"operation must be one of: {', '.join(OPERATION_CLASSES)}.")
+    return OPERATION_CLASSES[name](actor, value)
+
+
+def apply_bulk_operation(operation, tickets, ticket_ids):
+    # tickets: the queryset the caller may touch (already scoped to the account).
+    return run_with_retry(lambda: _apply(operation, tickets, ticket_ids))
+
+
+def _apply(operation, tickets, ticket_ids):
+    now = timezone.now()
+    report = {"updated": [], "unchanged": [], "rejected": []}
+
+    with transaction.atomic():
+        rows = {}
+        for start in range(0, len(ticket_ids), BULK_CHUNK_SIZE):
+            chunk = ticket_ids[start:start + BULK_CHUNK_SIZE]
+            rows.update(
+                (row["id"], row)
+                for row in tickets.select_for_update().filter(id__in=chunk).values(*ROW_FIELDS)
+            )
+
+        accepted = []
+        for ticket_id in ticket_ids:
+            row = rows.get(ticket_id)
+            if row is None:
+                report["rejected"].append({"id": ticket_id, "error": "Ticket not found."})
+                continue
+            error = operation.check(row)
+            if error:
+                report["rejected"].append({"id": ticket_id, "error": error})
+            elif operation.is_noop(row):
+                report["unchanged"].append(ticket_id)
+            else:
+                accepted.append(row)
+
+        if not accepted:
+            return report
+        operation.prepare(accepted)
+
+        groups = {}
+        for row in accepted:
+            groups.setdefault(operation.group_key(row), []).append(row)
+
+        history = []
+        for key, group in groups.items():
+            values = operation.values(key, now)
+            ids = [row["id"] for row in group]
+            for start in range(0, len(ids), BULK_CHUNK_SIZE):
+                Ticket.objects.filter(id__in=ids[start:start + BULK_CHUNK_SIZE]).update(changed_at=now, **values)
+            history.extend(
+                TicketHistory(ticket_id=row["id"], updated_by=operation.actor, changes=operation.changes(row, values))
+                for row in group
+            )
+        TicketHistory.objects.bulk_create(history, batch_size=BULK_CHUNK_SIZE)
+        operation.after_update(accepted, now)
+
+        # One notification per affected user, however many of their tickets moved.
+        affected = {}
+        for row in accepted:
+            for user_id in {row["creator_id_id"], row["assignee_id_id"]}:
+                if user_id:
+                    affected.setdefault(user_id, []).append(row["id"])
+        if isinstance(operation, AssignOperation):
+            affected.setdefault(operation.agent.id, [row["id"] for row in accepted])
+        _create_notifications_bulk(
+            notifier=operation.actor,
+            entries=[
+                (user_ticket_ids[0], operation.purpose(len(user_ticket_ids)), [user_id], len(user_ticket_ids))
+                for user_id, user_ticket_ids in affected.items()
+            ],
+            batch_size=BULK_CHUNK_SIZE
+        )
+
+    report["updated"] = [row["id"] for row in accepted]
+    return report
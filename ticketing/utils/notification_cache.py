@@ -0,0 +1,122 @@
+import uuid
+from django.core.cache import cache
+from ..db_router import primary_reads
+
+UNREAD_TTL = 60 * 60
+LATEST_TTL = 30
+LATEST_SIZE = 10
+
+
+def unread_key(user_id):
+    return f"ticketing:notifications:{user_id}:unread"
+
+
+def version_key(user_id):
+    return f"ticketing:notifications:{user_id}:version"
+
+
+def latest_key(user_id, version, audience_stamp=""):
+    return f"ticketing:notifications:{user_id}:latest:{version}:{audience_stamp}"
+
+
+def audience_key(account_id):
+    return f"ticketing:notifications:account:{account_id}:audience"
+
+
+def audience_unread_key(user_id, audience_stamp):
+    return f"ticketing:notifications:{user_id}:audience_unread:{audience_stamp}"
+
+
+def bump_versions(user_ids):
+    cache.set_many({version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+
+def record_new_notifications(user_ids):
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    # Only counters that are already warm are incremented; cold ones are
+    # rebuilt from the database on the next read.
+    warm = cache.get_many([unread_key(user_id) for user_id in user_ids])
+    for key in warm:
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+    bump_versions(user_ids)
+
+
+def record_audience_notification(account_id):
+    # One stamp per account instead of touching every agent's counters.
+    cache.set(audience_key(account_id), uuid.uuid4().hex, None)
+
+
+def audience_stamp(account_id):
+    stamp = cache.get(audience_key(account_id))
+    if stamp is None:
+        stamp = uuid.uuid4().hex
+        if not cache.add(audience_key(account_id), stamp, None):
+            stamp = cache.get(audience_key(account_id), stamp)
+    return stamp
+
+
+def forget_unread(user_id, account_id=None):
+    keys = [unread_key(user_id)]
+    if account_id:
+        keys.append(audience_unread_key(user_id, audience_stamp(account_id)))
+    cache.delete_many(keys)
+    bump_versions([user_id])
+
+
+def _fill_counter(key, user_id, rebuild):
+    # Every write that changes a user's counters bumps their version stamp,
+    # so a rebuild that raced with one is returned but not cached.
+    version = cache.get(version_key(user_id))
+    with primary_reads():
+        count = rebuild()
+    if cache.get(version_key(user_id)) == version and cache.add(key, count, UNREAD_TTL):
+        if cache.get(version_key(user_id)) != version:
+            cache.delete(key)
+    return count
+
+
+def get_unread_count(user_id, rebuild):
+    count = cache.get(unread_key(user_id))
+    if count is None:
+        count = _fill_counter(unread_key(user_id), user_id, rebuild)
+    return count
+
+
+def peek_unread_count(user_id, account_id=None):
+    # Cache-only read for the live stream; None when a counter is cold.
+    keys = [unread_key(user_id)]
+    if account_id:
+        keys.append(audience_unread_key(user_id, audience_stamp(account_id)))
+    counts = cache.get_many(keys)
+    if len(counts) != len(keys):
+        return None
+    return sum(counts.values())
+
+
+def get_audience_unread_count(user_id, account_id, rebuild):
+    key = audience_unread_key(user_id, audience_stamp(account_id))
+    count = cache.get(key)
+    if count is None:
+        count = _fill_counter(key, user_id, rebuild)
+    return count
+
+
+def get_latest(user_id, rebuild, account_id=None):
+    version = cache.get(version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(version_key(user_id), version, None):
+            version = cache.get(version_key(user_id), version)
+
+    key = latest_key(user_id, version, audience_stamp(account_id) if account_id else "")
+    latest = cache.get(key)
+    if latest is None:
+        with primary_reads():
+            latest = list(rebuild())
+        cache.set(key, latest, LATEST_TTL)
+    return latest
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "ticketing:notify:"
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def user_channel(user_id):
+    return f"{CHANNEL_PREFIX}user:{user_id}"
+
+
+def account_channel(account_id):
+    return f"{CHANNEL_PREFIX}account:{account_id}"
+
+
+class NotificationHub:
+    # One per process: a single backend listener feeds a small asyncio queue
+    # per open stream, so an idle connection costs one queue, not a socket.
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.loop = None
+        self.subscribers = {}
+        self._listener = None
+
+    def subscribe(self, channels):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.subscribers = {}
+            self._listener = None
+        if self._listener is None or self._listener.done():
+            self._listener = loop.create_task(self.backend.listen(self))
+
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        for channel in channels:
+            self.subscribers.setdefault(channel, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue, channels):
+        for channel in channels:
+            queues = self.subscribers.get(channel)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self.subscribers[channel]
+
+    def dispatch(self, channel, message):
+        for queue in list(self.subscribers.get(channel, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A stalled client only loses live updates; the next page load catches up.
+                pass
+
+
+class RedisBackend:
+
+    def __init__(self, url):
+        self.url = url
+        self._client = None
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        import redis
+
+        with self._lock:
+            if self._client is None:
+                self._client = redis.Redis.from_url(self.url)
+        self._client.publish(channel, message)
+
+    async def listen(self, hub):
+        import redis.asyncio as aioredis
+
+        while True:
+            client = aioredis.Redis.from_url(self.url)
+            try:
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        hub.dispatch(message["channel"].decode(), message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Notification stream lost its Redis subscription, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                await client.aclose()
+
+
+class InMemoryBackend:
+    # Stand-in for tests and single-process development: publishers and
+    # streams must live in the same process.
+
+    def publish(self, channel, message):
+        hub = get_hub()
+        if hub.loop is None or hub.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is hub.loop:
+            hub.dispatch(channel, message)
+        else:
+            hub.loop.call_soon_threadsafe(hub.dispatch, channel, message)
+
+    async def listen(self, hub):
+        await asyncio.Event().wait()
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            if getattr(settings, "NOTIFICATION_STREAM_BACKEND", "memory") == "memory":
+                backend = InMemoryBackend()
+            else:
+                backend = RedisBackend(settings.NOTIFICATION_STREAM_REDIS_URL)
+            _hub = NotificationHub(backend)
+        return _hub
+
+
+def publish_notification(notification, user_ids=(), account_id=None):
+    if not getattr(settings, "NOTIFICATION_STREAM_ENABLED", False):
+        return
+    message = json.dumps({
+        "id": notification.id,
+        "ticket_id": notification.ticket_id,
+        "purpose": notification.purpose,
+        "event_count": notification.event_count,
+        "sent_at": notification.sent_at.isoformat(),
+    })
+    channels = [user_channel(user_id) for user_id in set(user_ids)]
+    if account_id:
+        channels.append(account_channel(account_id))
+
+    backend = get_hub().backend
+    for channel in channels:
+        try:
+            backend.publish(channel, message)
+        except Exception:
+            logger.exception("Could not publish notification %s", notification.id)
+            return
@@ -1,48 +1,347 @@
-from django.db import transaction
-from ..models.notifications import Notification, NotificationRecipient, TicketPurpose
+import logging
+from datetime import timedelta
+from celery import current_app
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models.notifications import (
+    Notification,
+    NotificationAudience,
+    NotificationDigestEntry,
+    NotificationRecipient,
+    TicketPurpose,
+)
 from ..models.tickets import Ticket
 from ..models.comments import Thread, Comment
-from ..models.users import AppUser
+from ..models.users import AppUser, DigestFrequency, UserType
+from . import notification_cache
+from .sqlite_retry import run_with_retry
+from .notification_stream import publish_notification
 
+logger = logging.getLogger(__name__)
 
-def _create_notification(ticket, notifier, purpose, recipients):
-    if not recipients:
+FANOUT_BATCH_SIZE = 1000
+
+DIGEST_INTERVALS = {
+    DigestFrequency.IMMEDIATE: timedelta(0),
+    DigestFrequency.HOURLY: timedelta(hours=1),
+    DigestFrequency.DAILY: timedelta(days=1),
+}
+
+
+def _create_notification(ticket, notifier, purpose, recipients, audience_account_id=None, coalesce=True):
+    if not recipients and not audience_account_id:
         return
 
+    user_ids = {getattr(user, "id", user) for user in recipients if user}
+    return run_with_retry(
+        lambda: _write_notification(ticket, notifier, purpose, user_ids, audience_account_id, coalesce)
+    )
+
+def _write_notification(ticket, notifier, purpose, user_ids, audience_account_id, coalesce):
     with transaction.atomic():
+        if coalesce:
+            user_ids = _hold_for_digest(ticket.id, notifier, purpose, user_ids)
+            if not audience_account_id:
+                if not user_ids:
+                    return
+                notification = _coalesce_into_recent(ticket.id, notifier, purpose, user_ids)
+                if notification is not None:
+                    return notification
+
         notification = Notification.objects.create(
             ticket=ticket,
             notifier=notifier,
-            purpose=purpose
+            purpose=purpose,
+            audience=NotificationAudience.ACCOUNT_AGENTS if audience_account_id else NotificationAudience.DIRECT,
+            audience_account_id=audience_account_id
         )
+        if audience_account_id:
+            transaction.on_commit(lambda: notification_cache.record_audience_notification(audience_account_id))
 
-        recipient_objs = [
-            NotificationRecipient(notification=notification, user=user)
-            for user in set(recipients)
-        ]
+        NotificationRecipient.objects.bulk_create([
+            NotificationRecipient(notification=notification, user_id=user_id)
+            for user_id in user_ids
+        ])
+        transaction.on_commit(lambda: notification_cache.record_new_notifications(user_ids))
+        transaction.on_commit(lambda: publish_notification(notification, user_ids, audience_account_id))
 
-        NotificationRecipient.objects.bulk_create(recipient_objs)
+    return notification
 
-def notify_ticket_created(ticket: Ticket, created_by):
+def _coalesce_into_recent(ticket_id, notifier, purpose, user_ids):
+    _, coalesced = _coalesce_entries(notifier, [(ticket_id, purpose, user_ids, 1)])
+    return coalesced[0] if coalesced else None
+
+def _coalesce_entries(notifier, entries):
+    # Merge each (ticket_id, purpose, user_ids, event_count) entry into the
+    # ticket's latest recent notification for exactly these users, unless one
+    # of them has read it. Returns (remaining entries, merged notifications).
+    window = getattr(settings, "NOTIFICATION_COALESCE_SECONDS", 0)
+    if not window or not entries:
+        return entries, []
+
+    now = timezone.now()
+    candidates = {
+        notification.id: notification
+        for notification in Notification.objects.select_for_update().filter(
+            ticket_id__in={ticket_id for ticket_id, _, _, _ in entries},
+            audience=NotificationAudience.DIRECT,
+            sent_at__gte=now - timedelta(seconds=window)
+        )
+    }
+    if not candidates:
+        return entries, []
+
+    recipients = {}
+    for notification_id, user_id, is_read, read_up_to in NotificationRecipient.objects.filter(
+        notification_id__in=candidates
+    ).values_list("notification_id", "user_id", "is_read", "user__notifications_read_up_to"):
+        ids, read = recipients.get(notification_id, (frozenset(), False))
+        recipients[notification_id] = (ids | {user_id}, read or is_read or read_up_to >= notification_id)
+
+    latest = {}
+    for notification_id in sorted(candidates, reverse=True):
+        ids, read = recipients.get(notification_id, (frozenset(), False))
+        latest.setdefault((candidates[notification_id].ticket_id, ids), (candidates[notification_id], read))
+
+    remaining, coalesced = [], []
+    for ticket_id, purpose, user_ids, event_count in entries:
+        candidate, read = latest.pop((ticket_id, frozenset(user_ids)), (None, False))
+        if candidate is None or read:
+            remaining.append((ticket_id, purpose, user_ids, event_count))
+            continue
+
+        Notification.objects.filter(pk=candidate.pk).update(
+            event_count=F("event_count") + event_count,
+            purpose=purpose,
+            notifier=notifier,
+            sent_at=now
+        )
+        candidate.event_count += event_count
+        candidate.purpose = purpose
+        candidate.notifier = notifier
+        candidate.sent_at = now
+        coalesced.append((candidate, user_ids))
+
+    for candidate, user_ids in coalesced:
+        # Unread counts are unchanged; only the cached latest lists move.
+        transaction.on_commit(lambda user_ids=user_ids: notification_cache.bump_versions(user_ids))
+        transaction.on_commit(lambda candidate=candidate, user_ids=user_ids: publish_notification(candidate, user_ids))
+    return remaining, [candidate for candidate, _ in coalesced]
+
+def _digest_user_ids(user_ids):
+    return set(
+        AppUser.objects.filter(id__in=user_ids)
+        .exclude(notification_digest=DigestFrequency.IMMEDIATE)
+        .values_list("id", flat=True)
+    ) if user_ids else set()
+
+def _record_digest_event(user_id, ticket_id, notifier, purpose, now, event_count=1):
+    changes = dict(event_count=F("event_count") + event_count, purpose=purpose, notifier=notifier, last_event_at=now)
+    if NotificationDigestEntry.objects.filter(user_id=user_id, ticket_id=ticket_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            NotificationDigestEntry.objects.create(
+                user_id=user_id,
+                ticket_id=ticket_id,
+                notifier=notifier,
+                purpose=purpose,
+                event_count=event_count,
+                first_event_at=now,
+                last_event_at=now
+            )
+    except IntegrityError:
+        NotificationDigestEntry.objects.filter(user_id=user_id, ticket_id=ticket_id).update(**changes)
+
+def _hold_for_digest(ticket_id, notifier, purpose, user_ids):
+    # Returns the users to notify now; digest users get a pending entry instead.
+    digest_ids = _digest_user_ids(user_ids)
+    now = timezone.now()
+    for user_id in digest_ids:
+        _record_digest_event(user_id, ticket_id, notifier, purpose, now)
+    return user_ids - digest_ids
+
+def flush_notification_digests(now=None):
+    # One notification per pending ticket, delivered once the user's oldest
+    # pending event is older than their digest interval.
+    now = now or timezone.now()
+    due_user_ids = set()
+    for frequency, interval in DIGEST_INTERVALS.items():
+        due_user_ids.update(
+            NotificationDigestEntry.objects.filter(
+                user__notification_digest=frequency,
+                first_event_at__lte=now - interval
+            ).values_list("user_id", flat=True).distinct()
+        )
+
+    delivered = 0
+    for user_id in sorted(due_user_ids):
+        with transaction.atomic():
+            entries = list(
+                NotificationDigestEntry.objects.select_for_update()
+                .filter(user_id=user_id)
+                .order_by("last_event_at", "id")
+            )
+            if not entries:
+                continue
+            notifications = Notification.objects.bulk_create([
+                Notification(
+                    ticket_id=entry.ticket_id,
+                    notifier_id=entry.notifier_id,
+                    purpose=entry.purpose,
+                    event_count=entry.event_count
+                )
+                for entry in entries
+            ])
+            NotificationRecipient.objects.bulk_create([
+                NotificationRecipient(notification=notification, user_id=user_id)
+                for notification in notifications
+            ])
+            NotificationDigestEntry.objects.filter(id__in=[entry.id for entry in entries]).delete()
+            transaction.on_commit(lambda user_id=user_id: notification_cache.record_new_notifications([user_id]))
+            transaction.on_commit(lambda notifications=notifications, user_id=user_id: [
+                publish_notification(notification, [user_id]) for notification in notifications
+            ])
+        delivered += len(notifications)
+    return delivered
+
+def _create_notifications_bulk(notifier, entries, batch_size=500):
+    # entries: (ticket_id, purpose, recipient user ids[, event_count])
+    entries = [
+        (ticket_id, purpose, {user_id for user_id in recipient_ids if user_id}, event_count[0] if event_count else 1)
+        for ticket_id, purpose, recipient_ids, *event_count in entries
+    ]
+    entries = [entry for entry in entries if entry[2]]
+
+    for start in range(0, len(entries), batch_size):
+        batch = entries[start:start + batch_size]
+        with transaction.atomic():
+            # Same digest and coalescing rules as _create_notification, one lookup per batch.
+            digest_ids = _digest_user_ids({user_id for _, _, user_ids, _ in batch for user_id in user_ids})
+            if digest_ids:
+                now = timezone.now()
+                for ticket_id, purpose, user_ids, event_count in batch:
+                    for user_id in user_ids & digest_ids:
+                        _record_digest_event(user_id, ticket_id, notifier, purpose, now, event_count)
+                batch = [
+                    (ticket_id, purpose, user_ids - digest_ids, event_count)
+                    for ticket_id, purpose, user_ids, event_count in batch
+                    if user_ids - digest_ids
+                ]
+            batch, _ = _coalesce_entries(notifier, batch)
+            if not batch:
+                continue
+
+            notifications = Notification.objects.bulk_create([
+                Notification(ticket_id=ticket_id, notifier=notifier, purpose=purpose, event_count=event_count)
+                for ticket_id, purpose, _, event_count in batch
+            ])
+            NotificationRecipient.objects.bulk_create(
+                [
+                    NotificationRecipient(notification=notification, user_id=user_id)
+                    for notification, (_, _, user_ids, _) in zip(notifications, batch)
+                    for user_id in user_ids
+                ],
+                batch_size=batch_size
+            )
+            user_ids = {user_id for _, _, batch_user_ids, _ in batch for user_id in batch_user_ids}
+            transaction.on_commit(lambda user_ids=user_ids: notification_cache.record_new_notifications(user_ids))
+            transaction.on_commit(lambda notifications=notifications, batch=batch: [
+                publish_notification(notification, user_ids)
+                for notification, (_, _, user_ids, _) in zip(notifications, batch)
+            ])
+
+
+def fan_out_to_agents(notification_id, account_id, batch_size=FANOUT_BATCH_SIZE):
+    # Safe to re-run: users that already have a row for the notification are skipped.
+    notification = Notification.objects.filter(pk=notification_id).first()
+    if notification is None:
+        return 0
+
+    agent_ids = AppUser.objects.filter(
+        role=UserType.AGENT,
+        is_active=True,
+        account_id=account_id
+    ).order_by("id").values_list("id", flat=True).iterator(chunk_size=batch_size)
+
+    delivered = 0
+    batch = []
+    for agent_id in agent_ids:
+        batch.append(agent_id)
+        if len(batch) == batch_size:
+            delivered += _deliver_batch(notification, batch)
+            batch = []
+    if batch:
+        delivered += _deliver_batch(notification, batch)
+    return delivered
+
+def _deliver_batch(notification, user_ids):
+    with transaction.atomic():
+        existing = set(
+            NotificationRecipient.objects.filter(
+                notification=notification,
+                user_id__in=user_ids
+            ).values_list("user_id", flat=True)
+        )
+        new_ids = [user_id for user_id in user_ids if user_id not in existing]
+        NotificationRecipient.objects.bulk_create(
+            [NotificationRecipient(notification=notification, user_id=user_id) for user_id in new_ids],
+            ignore_conflicts=True
+        )
+        transaction.on_commit(lambda: notification_cache.record_new_notifications(new_ids))
+        transaction.on_commit(lambda: publish_notification(notification, new_ids))
+    return len(new_ids)
+
+def _dispatch_fan_out(notification_id, account_id):
+    if getattr(settings, "NOTIFICATION_FANOUT_EAGER", False):
+        fan_out_to_agents(notification_id, account_id)
+        return
+    try:
+        current_app.send_task(
+            "ticketing.tasks.fan_out_notification",
+            args=[notification_id, account_id]
+        )
+    except Exception:
+        logger.exception("Could not queue fan-out for notification %s, delivering inline", notification_id)
+        fan_out_to_agents(notification_id, account_id)
+
+def _notify_ticket_audience(ticket, notifier, purpose):
+    # Assigned tickets notify creator and assignee directly. Unassigned ones go
+    # to every active agent of the account: with "read" delivery as a single
+    # audience row, with "write" delivery through the Celery fan-out task.
     if ticket.assignee_id:
-        recipients = [
-            ticket.creator_id,
-            ticket.assignee_id
-        ]
-    else:
-        agents = AppUser.objects.filter(
-            role="AGENT",
-            is_active=True,
-            account_id=ticket.creator_id.account_id
+        _create_notification(
+            ticket=ticket,
+            notifier=notifier,
+            purpose=purpose,
+            recipients=[ticket.creator_id, ticket.assignee_id]
         )
-        recipients = list(agents) + [ticket.creator_id]
+        return
 
-    _create_notification(
+    account_id = ticket.creator_id.account_id_id
+    if getattr(settings, "NOTIFICATION_AUDIENCE_DELIVERY", "read") == "read":
+        _create_notification(
+            ticket=ticket,
+            notifier=notifier,
+            purpose=purpose,
+            recipients=[ticket.creator_id],
+            audience_account_id=account_id
+        )
+        return
+
+    notification = _create_notification(
         ticket=ticket,
-        notifier=created_by,
-        purpose=TicketPurpose.Ticket_Created,
-        recipients=recipients
+        notifier=notifier,
+        purpose=purpose,
+        recipients=[ticket.creator_id],
+        coalesce=False
     )
+    transaction.on_commit(lambda: _dispatch_fan_out(notification.id, account_id))
+
+def notify_ticket_created(ticket: Ticket, created_by):
+    _notify_ticket_audience(ticket, created_by, TicketPurpose.Ticket_Created)
 
 def notify_ticket_assigned(ticket: Ticket, assigned_by):
     if not ticket.assignee_id:
@@ -78,43 +377,26 @@ def notify_ticket_status_updated(ticket: Ticket, updated_by, old_status):
 def notify_comment_added(comment: Comment, commented_by):
     ticket = comment.ticket
 
-    if ticket.assignee_id:
-        recipients = [
-            ticket.creator_id,
-            ticket.assignee_id
-        ]
-
-    else:
-        agents = AppUser.objects.filter(
-            role="AGENT",
-            is_active=True,
-            account_id=ticket.creator_id.account_id
-        )
-        recipients = list(agents) + [ticket.creator_id]
-
     purpose = (
         f"{commented_by.name} has commented on Ticket "
         f"'{ticket.title}':\n{comment.thread.body}"
     )
 
-    _create_notification(
-        ticket=ticket,
-        notifier=commented_by,
-        purpose=purpose,
-        recipients=recipients
-    )
-
+    _notify_ticket_audience(ticket, commented_by, purpose)
 
-def notify_reply_added(thread: Thread, replied_by):
-    try:
-        comment = Comment.objects.get(thread__thread_group=thread.thread_group)
-    except Comment.DoesNotExist:
-        return
 
-    ticket = comment.ticket
+def notify_reply_added(thread: Thread, replied_by, root=None, ticket=None):
+    if root is None or ticket is None:
+        try:
+            comment = Comment.objects.select_related("ticket", "thread").get(
+                thread__thread_group=thread.thread_group
+            )
+        except Comment.DoesNotExist:
+            return
+        root, ticket = comment.thread, comment.ticket
 
-    participant_ids = Thread.objects.filter(thread_group=thread.thread_group).values_list("commented_by_id", flat=True)
-    recipients = AppUser.objects.filter(id__in=participant_ids)
+    # The root thread keeps the participant set, so there is no need to scan the group.
+    participant_ids = root.participant_ids or [root.commented_by_id, thread.commented_by_id]
 
     purpose = f"{replied_by.name} replied on Ticket '{ticket.title}': \n {thread.body}"
 
@@ -122,7 +404,7 @@ def notify_reply_added(thread: Thread, replied_by):
         ticket=ticket,
         notifier=replied_by,
         purpose=purpose,
-        recipients=recipients
+        recipients=participant_ids
     )
 
 def notify_auto_status_update(ticket, old_status, new_status, notifier):
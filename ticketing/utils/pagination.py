@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import timedelta
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(*values):
+    payload = [value.isoformat() if hasattr(value, "isoformat") else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor.")
+    return values
+
+
+def decode_datetime_cursor(cursor):
+    # Cursors over (datetime, id) pairs, e.g. (changed_at, id).
+    values = decode_cursor(cursor)
+    if len(values) != 2:
+        raise ValueError("Invalid cursor.")
+    moment = parse_datetime(values[0]) if isinstance(values[0], str) else None
+    if moment is None or not is_db_int(values[1]):
+        raise ValueError("Invalid cursor.")
+    return moment, values[1]
+
+
+def decode_duration_cursor(cursor):
+    # Cursors over (duration in microseconds, datetime, id) triples.
+    values = decode_cursor(cursor)
+    if len(values) != 3 or not is_db_int(values[0]) or not is_db_int(values[2]):
+        raise ValueError("Invalid cursor.")
+    moment = parse_datetime(values[1]) if isinstance(values[1], str) else None
+    if moment is None:
+        raise ValueError("Invalid cursor.")
+    try:
+        duration = timedelta(microseconds=values[0])
+    except OverflowError:
+        raise ValueError("Invalid cursor.")
+    return duration, moment, values[2]
+
+
+def is_db_int(value):
+    # SQLite integers are signed 64-bit; anything wider fails when bound.
+    return isinstance(value, int) and not isinstance(value, bool) and -2 ** 63 <= value < 2 ** 63
+
+
+def keyset_after(field, value, pk, descending=False):
+    op = "lt" if descending else "gt"
+    return Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"id__{op}": pk})
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class HashingPoolBusy(Exception):
+    pass
+
+
+_pool = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def _init_worker(settings_module):
+    if settings_module:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+def _verify(password, encoded):
+    # check_password calls the setter when the stored hash uses an outdated
+    # hasher or iteration count; the new hash is returned for the caller to save.
+    upgraded = []
+    valid = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return valid, (upgraded[0] if upgraded else None)
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, "PASSWORD_HASH_WORKERS", 2),
+                initializer=_init_worker,
+                initargs=(os.environ.get("DJANGO_SETTINGS_MODULE"),)
+            )
+        return _pool
+
+
+def _reset_pool(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _release():
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def _submit(fn, *args):
+    # Hashing is CPU bound: it runs in worker processes, and once the backlog
+    # reaches PASSWORD_HASH_MAX_PENDING new requests are turned away at once.
+    # The slot is freed when the job finishes, even if the caller stopped waiting.
+    global _pending
+    with _lock:
+        if _pending >= getattr(settings, "PASSWORD_HASH_MAX_PENDING", 32):
+            raise HashingPoolBusy()
+        _pending += 1
+    pool = _get_pool()
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _release()
+        _reset_pool(pool)
+        raise
+    except BaseException:
+        _release()
+        raise
+    future.add_done_callback(lambda _: _release())
+    return pool, future
+
+
+def _call(fn, *args):
+    # Blocks the calling thread until the worker answers.
+    pool, future = _submit(fn, *args)
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+
+
+async def _acall(fn, *args):
+    # Async views await the worker, so no thread is held while it hashes.
+    pool, future = _submit(fn, *args)
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+
+
+def verify_password(password, encoded):
+    return _call(_verify, password, encoded)
+
+
+async def averify_password(password, encoded):
+    return await _acall(_verify, password, encoded)
+
+
+def hash_password(password):
+    return _call(make_password, password)
+
+
+async def ahash_password(password):
+    return await _acall(make_password, password)
@@ -0,0 +1,46 @@
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from ..db_router import primary_reads
+from ..models.users import AppUser
+
+
+def version_key(user_id):
+    return f"ticketing:principal:{user_id}:version"
+
+
+def principal_key(user_id, version):
+    return f"ticketing:principal:{user_id}:{version}"
+
+
+def bump_version(user_id):
+    cache.set(version_key(user_id), uuid.uuid4().hex, None)
+
+
+def get_user(user_id):
+    version = cache.get(version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(version_key(user_id), version, None):
+            version = cache.get(version_key(user_id), version)
+
+    key = principal_key(user_id, version)
+    user = cache.get(key)
+    if user is None:
+        with primary_reads():
+            user = AppUser.objects.select_related("account_id").filter(id=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, getattr(settings, "PRINCIPAL_CACHE_TTL", 60))
+    return user
+
+
+def _on_user_change(sender, instance, **kwargs):
+    # Saves cover soft deletes; queryset .update() callers bump the version themselves.
+    transaction.on_commit(lambda: bump_version(instance.pk))
+
+
+post_save.connect(_on_user_change, sender=AppUser, weak=False)
+post_delete.connect(_on_user_change, sender=AppUser, weak=False)
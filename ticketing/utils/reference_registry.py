@@ -0,0 +1,79 @@
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from ..db_router import primary_reads
+
+
+# Process-wide copy of a small reference table, keyed by name and by id.
+# Dropped locally by save/delete signals and, for every other web or Celery
+# worker, through a version stamp kept in the shared cache.
+class ReferenceRegistry:
+    def __init__(self, model, name_field):
+        self.model = model
+        self.name_field = name_field
+        self.version_key = f"ticketing:registry:{model._meta.label_lower}:version"
+        self._lock = threading.Lock()
+        self._by_name = None
+        self._by_id = None
+        self._version = None
+        self._checked_at = 0.0
+
+        post_save.connect(self._on_change, sender=model, weak=False)
+        post_delete.connect(self._on_change, sender=model, weak=False)
+
+    def _on_change(self, **kwargs):
+        transaction.on_commit(self.invalidate)
+
+    def invalidate(self):
+        with self._lock:
+            self._by_name = None
+            self._by_id = None
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def _shared_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(self.version_key, version, None):
+                version = cache.get(self.version_key)
+        return version
+
+    def _load(self):
+        check_every = getattr(settings, "REFERENCE_REGISTRY_CHECK_SECONDS", 5)
+        now = time.monotonic()
+        with self._lock:
+            if self._by_id is not None and now - self._checked_at < check_every:
+                return self._by_name, self._by_id
+
+            version = self._shared_version()
+            if self._by_id is None or version != self._version:
+                with primary_reads():
+                    rows = list(self.model.objects.order_by("id"))
+                self._by_id = {row.pk: row for row in rows}
+                self._by_name = {getattr(row, self.name_field): row for row in rows}
+                self._version = version
+            self._checked_at = now
+            return self._by_name, self._by_id
+
+    def all(self):
+        return list(self._load()[1].values())
+
+    def get(self, name):
+        by_name, _ = self._load()
+        if name not in by_name:
+            raise self.model.DoesNotExist(f"{self.model.__name__} '{name}' does not exist.")
+        return by_name[name]
+
+    def by_id(self, pk):
+        _, by_id = self._load()
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise self.model.DoesNotExist(f"{self.model.__name__} {pk!r} does not exist.")
+        if pk not in by_id:
+            raise self.model.DoesNotExist(f"{self.model.__name__} {pk} does not exist.")
+        return by_id[pk]
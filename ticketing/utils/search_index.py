@@ -0,0 +1,179 @@
+import re
+from django.db import connection, connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from ..models.comments import Comment, Thread
+from ..models.tickets import Ticket
+
+# One FTS5 table holds tickets and comment threads. The account and ticket
+# are indexed as tokens ("a12", "t345") so the account filter is part of
+# the MATCH and a ticket's rows can be dropped without a table scan.
+# Row ids: tickets are even (id * 2), threads odd (id * 2 + 1).
+TABLE = "ticketing_search"
+COLUMN_WEIGHTS = "0.0, 0.0, 10.0, 1.0"  # account, ticket, title, body
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "account, ticket, title, body, kind UNINDEXED, tokenize = 'porter unicode61', prefix = '3 4')"
+)
+DROP_TABLE = f"DROP TABLE IF EXISTS {TABLE}"
+
+REBUILD_TICKETS = f"""
+    INSERT INTO {TABLE} (rowid, account, ticket, title, body, kind)
+    SELECT t.id * 2, 'a' || u.account_id_id, 't' || t.id, t.title, t.description, 'ticket'
+    FROM ticketing_ticket t JOIN ticketing_appuser u ON u.id = t.creator_id_id
+"""
+REBUILD_THREADS = f"""
+    INSERT INTO {TABLE} (rowid, account, ticket, title, body, kind)
+    SELECT th.id * 2 + 1, 'a' || u.account_id_id, 't' || c.ticket_id, '', th.body, 'comment'
+    FROM ticketing_comment c
+    JOIN ticketing_thread root ON root.id = c.thread_id
+    JOIN ticketing_thread th ON th.thread_group = root.thread_group
+    JOIN ticketing_ticket t ON t.id = c.ticket_id
+    JOIN ticketing_appuser u ON u.id = t.creator_id_id
+"""
+
+
+def enabled(using=None):
+    return connections[using or "default"].vendor == "sqlite"
+
+
+def ticket_rowid(ticket_id):
+    return ticket_id * 2
+
+
+def thread_rowid(thread_id):
+    return thread_id * 2 + 1
+
+
+def rebuild_index(using="default"):
+    # One transaction, so searches never see the table emptied half way.
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(REBUILD_TICKETS)
+        cursor.execute(REBUILD_THREADS)
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLE}")
+        return cursor.fetchone()[0]
+
+
+def _upsert(rowid, account_id, ticket_id, title, body, kind):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [rowid])
+        cursor.execute(
+            f"INSERT INTO {TABLE} (rowid, account, ticket, title, body, kind) VALUES (%s, %s, %s, %s, %s, %s)",
+            [rowid, f"a{account_id}", f"t{ticket_id}", title, body, kind]
+        )
+
+
+def _delete(rowid):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [rowid])
+
+
+def index_ticket(ticket):
+    _upsert(ticket_rowid(ticket.pk), ticket.creator_id.account_id_id, ticket.pk, ticket.title, ticket.description, "ticket")
+
+
+def index_thread(thread, ticket_id=None, account_id=None):
+    if ticket_id is None:
+        # Replies reach their ticket through the root thread's comment.
+        owner = Comment.objects.filter(thread__thread_group=thread.thread_group).values_list(
+            "ticket_id", "ticket__creator_id__account_id"
+        ).first()
+        if owner is None:
+            # A root thread is indexed once its Comment row exists.
+            return
+        ticket_id, account_id = owner
+    _upsert(thread_rowid(thread.pk), account_id, ticket_id, "", thread.body, "comment")
+
+
+def build_match(account_id, text):
+    terms = re.findall(r"\w+", text or "")[:12]
+    if not terms:
+        return None
+    # Every term is quoted so user input cannot inject FTS syntax. The last
+    # one is a prefix (served by the 3/4-character prefix indexes) so results
+    # show up while a word is still being typed.
+    quoted = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= 3:
+        quoted[-1] += "*"
+    return f'account : "a{account_id}" AND {{title body}} : ({" ".join(quoted)})'
+
+
+def search(account_id, text, limit=20, offset=0):
+    match = build_match(account_id, text)
+    if match is None:
+        return []
+    using = router.db_for_read(Ticket)
+    if not enabled(using):
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid, kind, substr(ticket, 2),
+                   snippet({TABLE}, -1, %s, %s, '…', 16),
+                   bm25({TABLE}, {COLUMN_WEIGHTS}) AS score
+            FROM {TABLE}
+            WHERE {TABLE} MATCH %s
+            ORDER BY score
+            LIMIT %s OFFSET %s
+            """,
+            [SNIPPET_START, SNIPPET_END, match, limit, offset]
+        )
+        return [
+            {"rowid": rowid, "kind": kind, "ticket_id": int(ticket_id), "snippet": snippet, "score": score}
+            for rowid, kind, ticket_id, snippet, score in cursor.fetchall()
+        ]
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>"))
+
+
+def _text_changed(ticket):
+    snapshot = getattr(ticket, "_snapshot", None)
+    if not snapshot:
+        return True
+    return snapshot.get("title") != ticket.title or snapshot.get("description") != ticket.description
+
+
+def _on_ticket_saved(sender, instance, created, **kwargs):
+    # Status and assignment saves leave the indexed text alone.
+    if enabled() and (created or _text_changed(instance)):
+        index_ticket(instance)
+
+
+def _on_ticket_deleted(sender, instance, **kwargs):
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE rowid IN (SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)",
+                [f'ticket : "t{instance.pk}"']
+            )
+
+
+def _on_thread_saved(sender, instance, **kwargs):
+    if enabled():
+        index_thread(instance)
+
+
+def _on_thread_deleted(sender, instance, **kwargs):
+    if enabled():
+        _delete(thread_rowid(instance.pk))
+
+
+def _on_comment_saved(sender, instance, created, **kwargs):
+    if enabled() and created:
+        index_thread(instance.thread, instance.ticket_id, instance.ticket.creator_id.account_id_id)
+
+
+post_save.connect(_on_ticket_saved, sender=Ticket, weak=False)
+post_delete.connect(_on_ticket_deleted, sender=Ticket, weak=False)
+post_save.connect(_on_thread_saved, sender=Thread, weak=False)
+post_delete.connect(_on_thread_deleted, sender=Thread, weak=False)
+post_save.connect(_on_comment_saved, sender=Comment, weak=False)
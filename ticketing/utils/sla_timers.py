@@ -0,0 +1,44 @@
+import logging
+from datetime import timedelta
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..models.scheduling import SLATimer
+
+logger = logging.getLogger(__name__)
+
+# Only tickets in these statuses are escalated once their deadline passes.
+SLA_TIMED_STATUSES = ["In-Progress", "Waiting-For-Customer"]
+
+
+def schedule_deadline_task(ticket_id, due_at):
+    eta = due_at
+    max_eta = getattr(settings, "SLA_MAX_ETA_SECONDS", None)
+    if max_eta:
+        # An ETA past the broker's visibility timeout would be redelivered, so
+        # far deadlines get a re-check at the cap; escalate_ticket_deadline
+        # finds the timer not yet due and schedules the next leg.
+        eta = min(due_at, timezone.now() + timedelta(seconds=max_eta))
+    try:
+        current_app.send_task(
+            "ticketing.tasks.escalate_ticket_deadline",
+            args=[ticket_id],
+            eta=eta
+        )
+    except Exception:
+        # The periodic safety-net sweep still picks the timer up from the table.
+        logger.exception("Could not schedule SLA timer for ticket %s", ticket_id)
+
+
+def sync_sla_timer(ticket, old_deadline=None):
+    if ticket.deadline and ticket.status.status in SLA_TIMED_STATUSES:
+        _, created = SLATimer.objects.update_or_create(
+            ticket_id=ticket.pk,
+            defaults={"due_at": ticket.deadline}
+        )
+        if created or old_deadline != ticket.deadline:
+            ticket_id, due_at = ticket.pk, ticket.deadline
+            transaction.on_commit(lambda: schedule_deadline_task(ticket_id, due_at))
+    else:
+        SLATimer.objects.filter(ticket_id=ticket.pk).delete()
@@ -0,0 +1,35 @@
+import logging
+import random
+import time
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+logger = logging.getLogger(__name__)
+
+LOCK_MESSAGES = ("database is locked", "database table is locked", "database is busy")
+
+
+def is_lock_error(exc):
+    message = str(exc).lower()
+    return any(text in message for text in LOCK_MESSAGES)
+
+
+def run_with_retry(write, using=None):
+    # Re-runs a whole write transaction when SQLite reports a lock, sleeping a
+    # jittered, exponentially growing delay in between. Inside an outer atomic
+    # block the transaction is already lost, so the error goes to the outermost caller.
+    connection = transaction.get_connection(using)
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        return write()
+
+    attempts = getattr(settings, "SQLITE_WRITE_ATTEMPTS", 5)
+    base_delay = getattr(settings, "SQLITE_RETRY_BASE_DELAY", 0.05)
+    for attempt in range(1, attempts + 1):
+        try:
+            return write()
+        except OperationalError as exc:
+            if attempt == attempts or not is_lock_error(exc):
+                raise
+            delay = random.uniform(0, base_delay * 2 ** (attempt - 1))
+            logger.warning("SQLite write hit a lock (attempt %s/%s), retrying in %.3fs", attempt, attempts, delay)
+            time.sleep(delay)
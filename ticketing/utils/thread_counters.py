@@ -0,0 +1,43 @@
+from django.db.models import Count, Max
+from ..models.comments import Thread
+
+
+def sync_thread_counters(fix=True, batch_size=500):
+    checked = mismatched = 0
+    last_id = 0
+    while True:
+        roots = list(
+            Thread.objects.filter(comment_entry__isnull=False, id__gt=last_id)
+            .order_by("id")
+            .only("id", "thread_group", "commented_by_id", "reply_count", "last_reply_at", "participant_ids")
+            [:batch_size]
+        )
+        if not roots:
+            break
+        last_id = roots[-1].id
+        groups = [root.thread_group for root in roots]
+
+        replies = Thread.objects.filter(thread_group__in=groups, comment_entry__isnull=True)
+        stats = {
+            row["thread_group"]: row
+            for row in replies.values("thread_group").annotate(total=Count("id"), last=Max("created_at"))
+        }
+        authors = {}
+        for group, author_id in replies.values_list("thread_group", "commented_by_id").distinct():
+            authors.setdefault(group, set()).add(author_id)
+
+        for root in roots:
+            checked += 1
+            row = stats.get(root.thread_group)
+            expected = {
+                "reply_count": row["total"] if row else 0,
+                "last_reply_at": row["last"] if row else None,
+                "participant_ids": sorted(authors[root.thread_group] | {root.commented_by_id}) if row else [],
+            }
+            if all(getattr(root, field) == value for field, value in expected.items()):
+                continue
+            mismatched += 1
+            if fix:
+                Thread.objects.filter(pk=root.pk).update(**expected)
+
+    return checked, mismatched
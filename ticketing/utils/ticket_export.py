@@ -0,0 +1,180 @@
+import csv
+import io
+import json
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q, Sum
+from django.utils.dateparse import parse_datetime
+from ..models.comments import Comment
+from ..models.tickets import Ticket, TicketHistory, priority_registry, status_registry
+
+EXPORT_FORMATS = ["csv", "ndjson"]
+EXPORT_CHUNK_SIZE = 500
+# Rows are buffered up to this many bytes before a chunk is handed to the response or compressor.
+EXPORT_BUFFER_BYTES = 64 * 1024
+
+CSV_COLUMNS = [
+    "id",
+    "title",
+    "status",
+    "priority",
+    "category",
+    "creator_id",
+    "assignee_id",
+    "start_time",
+    "deadline",
+    "created_at",
+    "changed_at",
+    "comment_count",
+    "reply_count",
+    "history",
+]
+
+
+def parse_since(value):
+    if not value:
+        return None
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError("since must be an ISO 8601 datetime.")
+    return since
+
+
+def _merge(rows, key):
+    # Yields (key, [rows]) groups from an iterator ordered by key.
+    group_key, group = None, []
+    for row in rows:
+        if row[key] != group_key and group:
+            yield group_key, group
+            group = []
+        group_key = row[key]
+        group.append(row)
+    if group:
+        yield group_key, group
+
+
+def export_records(tickets, since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    # Tickets, their history and their comment counts are read as three
+    # id-ordered cursors and merge-joined, so memory does not grow with the account.
+    if since:
+        # Comments and replies do not touch Ticket.changed_at; a new comment
+        # shows on its Comment row, a new reply on the root thread's last_reply_at.
+        commented = Comment.objects.filter(
+            Q(created_at__gte=since) | Q(thread__last_reply_at__gte=since)
+        ).values("ticket_id")
+        tickets = tickets.filter(Q(changed_at__gte=since) | Q(id__in=commented))
+    tickets = tickets.order_by("id")
+    ticket_ids = tickets.values("id")
+
+    history = TicketHistory.objects.filter(ticket_id__in=ticket_ids)
+    if since:
+        history = history.filter(updated_at__gte=since)
+    history_groups = _merge(
+        history.order_by("ticket_id", "id")
+        .values("ticket_id", "updated_at", "updated_by_id", "changes")
+        .iterator(chunk_size=chunk_size),
+        "ticket_id"
+    )
+    counts = (
+        Comment.objects.filter(ticket_id__in=ticket_ids)
+        .values("ticket_id")
+        .annotate(comment_count=Count("id"), reply_count=Sum("thread__reply_count"))
+        .order_by("ticket_id")
+        .iterator(chunk_size=chunk_size)
+    )
+
+    next_history = next(history_groups, None)
+    next_count = next(counts, None)
+    for ticket in tickets.values(
+        "id", "title", "status_id", "priority_id_id", "ticket_category", "creator_id_id",
+        "assignee_id_id", "start_time", "deadline", "created_at", "changed_at"
+    ).iterator(chunk_size=chunk_size):
+        ticket_id = ticket["id"]
+
+        while next_history is not None and next_history[0] < ticket_id:
+            next_history = next(history_groups, None)
+        entries = []
+        if next_history is not None and next_history[0] == ticket_id:
+            entries = [
+                {"updated_at": row["updated_at"], "updated_by": row["updated_by_id"], "changes": row["changes"]}
+                for row in next_history[1]
+            ]
+            next_history = next(history_groups, None)
+
+        while next_count is not None and next_count["ticket_id"] < ticket_id:
+            next_count = next(counts, None)
+        comment_count = reply_count = 0
+        if next_count is not None and next_count["ticket_id"] == ticket_id:
+            comment_count, reply_count = next_count["comment_count"], next_count["reply_count"] or 0
+            next_count = next(counts, None)
+
+        yield {
+            "id": ticket_id,
+            "title": ticket["title"],
+            "status": status_registry.by_id(ticket["status_id"]).status,
+            "priority": priority_registry.by_id(ticket["priority_id_id"]).priority,
+            "category": ticket["ticket_category"],
+            "creator_id": ticket["creator_id_id"],
+            "assignee_id": ticket["assignee_id_id"],
+            "start_time": ticket["start_time"],
+            "deadline": ticket["deadline"],
+            "created_at": ticket["created_at"],
+            "changed_at": ticket["changed_at"],
+            "comment_count": comment_count,
+            "reply_count": reply_count,
+            "history": entries,
+        }
+
+
+def _ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + "\n"
+
+
+def _csv_lines(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for record in records:
+        record["history"] = json.dumps(record["history"], cls=DjangoJSONEncoder)
+        writer.writerow([
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in (record[column] for column in CSV_COLUMNS)
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _buffered(lines):
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_BYTES:
+            yield "".join(chunk).encode()
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk).encode()
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(tickets, export_format, since=None, gzip=False):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}.")
+    records = export_records(tickets, since=since)
+    lines = _csv_lines(records) if export_format == "csv" else _ndjson_lines(records)
+    chunks = _buffered(lines)
+    return _gzipped(chunks) if gzip else chunks
+
+
+def account_tickets(account_id):
+    return Ticket.objects.filter(creator_id__account_id=account_id)
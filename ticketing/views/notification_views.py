@@ -1,17 +1,125 @@
-from django.http import JsonResponse
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.functions import Greatest
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.contrib import messages
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from ..models.notifications import NotificationRecipient
+from ..models.notifications import Notification, NotificationRecipient
+from ..models.users import AppUser, UserType
 from ..permissions import AccountAwareMixin
+from ..serializers.user_form import NotificationDigestForm
+from ..utils import notification_cache, principal_cache
+from ..utils.notification_stream import account_channel, get_hub, user_channel
 
 @method_decorator(csrf_exempt, name="dispatch")
 class MarkNotificationsReadView(AccountAwareMixin, View):
 
     def post(self, request):
-        NotificationRecipient.objects.filter(
+        # Moving the read watermark is a single-row write, however large the backlog.
+        # The page sends the newest id it showed so later arrivals stay unread.
+        up_to = Notification.objects.aggregate(latest=Max("id"))["latest"] or 0
+        try:
+            up_to = min(up_to, int(request.POST.get("up_to", up_to)))
+        except ValueError:
+            pass
+
+        AppUser.objects.filter(pk=request.user.pk).update(
+            notifications_read_up_to=Greatest("notifications_read_up_to", up_to)
+        )
+        principal_cache.bump_version(request.user.pk)
+
+        # Notifications above up_to are still unread, so rebuild the count from the watermark.
+        notification_cache.forget_unread(request.user.id, Notification.audience_account_for(request.user))
+        return JsonResponse({"status": "success"})
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class MarkNotificationReadView(AccountAwareMixin, View):
+
+    def post(self, request, notification_id):
+        notification = get_object_or_404(Notification.visible_to(request.user), id=notification_id)
+        NotificationRecipient.objects.update_or_create(
+            notification=notification,
             user=request.user,
-            is_read=False
-        ).update(is_read=True)
+            defaults={"is_read": True}
+        )
+
+        notification_cache.forget_unread(request.user.id, Notification.audience_account_for(request.user))
+        return JsonResponse({"status": "success"})
+
+
+class NotificationPreferencesView(AccountAwareMixin, View):
+
+    def post(self, request):
+        form = NotificationDigestForm(request.POST)
+        if form.is_valid():
+            # The principal may be a cached copy, so only this column is written.
+            AppUser.objects.filter(pk=request.user.pk).update(
+                notification_digest=form.cleaned_data["notification_digest"]
+            )
+            principal_cache.bump_version(request.user.pk)
+            messages.success(request, "Notification preferences saved.")
+        else:
+            messages.error(request, "Invalid notification preference.")
+
+        next_url = request.POST.get("next")
+        if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+            return redirect(next_url)
+        return redirect("agent_dashboard_page" if request.user.role == UserType.AGENT else "customer_dashboard_page")
+
+
+class NotificationStreamView(View):
+    # Server-Sent Events; serve through the ASGI app so idle streams only hold a coroutine.
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            # Under WSGI the stream would be buffered whole; 204 tells EventSource not to reconnect.
+            return HttpResponse(status=204)
+        user_id = await request.session.aget("user_id")
+        if not user_id:
+            return HttpResponseForbidden("Login required")
+        try:
+            user = await AppUser.objects.aget(id=user_id)
+        except AppUser.DoesNotExist:
+            return HttpResponseForbidden("Login required")
+
+        account_id = Notification.audience_account_for(user)
+        channels = [user_channel(user.id)]
+        if account_id:
+            channels.append(account_channel(account_id))
+
+        response = StreamingHttpResponse(
+            self.event_stream(user.id, account_id, channels),
+            content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
 
-        return JsonResponse({"status": "success"})
\ No newline at end of file
+    async def event_stream(self, user_id, account_id, channels):
+        heartbeat = getattr(settings, "NOTIFICATION_STREAM_HEARTBEAT", 25)
+        hub = get_hub()
+        queue = hub.subscribe(channels)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                payload = json.loads(message)
+                payload["unread_count"] = await sync_to_async(notification_cache.peek_unread_count)(
+                    user_id, account_id
+                )
+                yield f"event: notification\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            hub.unsubscribe(queue, channels)
@@ -1,16 +1,22 @@
+import json
+from django.db import transaction
 from django.views import View
 from datetime import timedelta
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from ..serializers.ticket_form import TicketForm, TicketUpdateForm
-from ..models.tickets import Ticket, TicketStatus, TicketHistory
-from ..permissions import CustomerRequiredMixin, AccountAwareMixin
+from ..models.tickets import Ticket, TicketHistory, TicketPriority, TicketStatus, priority_registry, status_registry
+from ..permissions import AgentRequiredMixin, CustomerRequiredMixin, AccountAwareMixin
 from django.contrib import messages
-from ..models.users import AppUser
 from ..models.comments import Thread, Comment
 from ..serializers.comment_form import ThreadForm
+from ..serializers.ticket_json import only_columns, parse_ticket_fields, stream_ticket_page
+from ..utils import search_index
+from ..utils.bulk_tickets import apply_bulk_operation, build_operation, parse_ticket_ids
+from ..utils.pagination import decode_datetime_cursor, is_db_int, keyset_after
 from ..utils.status_transition import get_allowed_transitions
+from ..utils.ticket_export import parse_since, stream_export
 from ..utils.notifications_utils import (
     notify_ticket_created,
     notify_ticket_assigned,
@@ -33,7 +39,7 @@ class CustomerTicketCreateView(CustomerRequiredMixin, AccountAwareMixin, View):
             ticket = form.save(commit=False)
             ticket.creator_id = request.user
 
-            ticket.status = TicketStatus.objects.get(status="TODO")
+            ticket.status = status_registry.get("TODO")
 
             duration_map = {
                 "1h": timedelta(hours=1),
@@ -50,7 +56,7 @@ class CustomerTicketCreateView(CustomerRequiredMixin, AccountAwareMixin, View):
             if ticket.assignee_id and sla_duration:
                 ticket.start_time = timezone.now()
                 ticket.deadline = ticket.start_time + sla_duration
-                ticket.status = TicketStatus.objects.get(status="In-Progress")
+                ticket.status = status_registry.get("In-Progress")
 
             ticket.save(updated_by=request.user)
             notify_ticket_created(ticket, request.user)
@@ -128,12 +134,11 @@ class TicketUpdateView(CustomerRequiredMixin, View):
 def Assign_ticket(request, pk):
     if request.method == "POST":
 
-        user_id = request.session.get("user_id")
-        if not user_id:
+        user = request.principal
+        if not user:
             messages.error(request, "Please login to assign tickets.")
             return redirect("login")
 
-        user = get_object_or_404(AppUser, id=user_id)
         ticket = get_object_or_404(Ticket, pk=pk)
 
         if ticket.assignee_id is None:
@@ -152,14 +157,15 @@ class TicketDetailView(AccountAwareMixin, View):
     login_url = "/login/"
 
     def get(self, request, pk):
-        ticket = get_object_or_404(Ticket, pk=pk)
+        ticket = get_object_or_404(
+            Ticket.objects.select_related("creator_id", "assignee_id"),
+            pk=pk
+        )
 
         if request.user.account_id != ticket.creator_id.account_id:
             return HttpResponseForbidden("You cannot view this ticket.")
 
-        comments = Thread.objects.filter(
-            comment_entry__ticket=ticket
-        ).order_by("-created_at")
+        comments = Thread.comment_roots(ticket)
 
         history = TicketHistory.objects.filter(
             ticket=ticket
@@ -175,22 +181,15 @@ class TicketDetailView(AccountAwareMixin, View):
         if "In-Progress" in allowed and not ticket.assignee_id:
             allowed.remove("In-Progress")
 
-        allowed_statuses = TicketStatus.objects.filter(
-            status__in=allowed
-        )
-
-        replies_dict = {}
-        for comment in comments:
-            replies = Thread.objects.filter(
-                thread_group=comment.thread_group
-            ).exclude(id=comment.id).order_by("created_at")
-            replies_dict[comment.id] = replies
+        allowed_statuses = [
+            status for status in status_registry.all()
+            if status.status in allowed
+        ]
 
         return render(request, "ticket_detail.html", {
             "ticket": ticket,
             "comments": comments,
             "history": history,
-            "replies_dict": replies_dict,
             "form": form,
             "allowed_statuses": allowed_statuses,
         })
@@ -198,11 +197,7 @@ class TicketDetailView(AccountAwareMixin, View):
     def post(self, request, pk):
         ticket = get_object_or_404(Ticket, pk=pk)
 
-        user_id = request.session.get("user_id")
-        if not user_id:
-            return HttpResponseForbidden("Login required")
-
-        user = get_object_or_404(AppUser, id=user_id)
+        user = request.user
 
         if user.account_id != ticket.creator_id.account_id:
             return HttpResponseForbidden("You cannot comment on this ticket.")
@@ -232,7 +227,10 @@ class UpdateTicketStatusView(AccountAwareMixin, View):
             messages.error(request, "No status selected.")
             return redirect("ticket_detail", pk=pk)
 
-        new_status = get_object_or_404(TicketStatus, pk=new_status_id)
+        try:
+            new_status = status_registry.by_id(new_status_id)
+        except TicketStatus.DoesNotExist:
+            raise Http404("No TicketStatus matches the given query.")
 
         current_status = old_status.status
         allowed = get_allowed_transitions(current_status)
@@ -267,15 +265,188 @@ class ReplyCommentView(AccountAwareMixin, View):
 
     def post(self, request, thread_id):
         original_thread = get_object_or_404(Thread, id=thread_id)
-        ticket = Comment.objects.get(thread=original_thread).ticket
+        comment = get_object_or_404(
+            Comment.objects.select_related("ticket", "thread"),
+            thread__thread_group=original_thread.thread_group
+        )
+        ticket = comment.ticket
 
         reply_body = request.POST.get("reply")
         if reply_body:
-            reply=Thread.objects.create(
-                body=reply_body,
-                commented_by=request.user,
-                thread_group=original_thread.thread_group
+            with transaction.atomic():
+                reply=Thread.objects.create(
+                    body=reply_body,
+                    commented_by=request.user,
+                    thread_group=original_thread.thread_group
+                )
+                comment.thread.record_reply(reply)
+            notify_reply_added(reply, request.user, root=comment.thread, ticket=ticket)
+
+        return redirect("ticket_detail", pk=ticket.pk)
+
+
+class ThreadRepliesView(AccountAwareMixin, View):
+    login_url = "/login/"
+
+    def get(self, request, thread_id):
+        comment = get_object_or_404(
+            Comment.objects.select_related("thread", "ticket__creator_id"),
+            thread_id=thread_id
+        )
+        if request.user.account_id != comment.ticket.creator_id.account_id:
+            return HttpResponseForbidden("You cannot view this ticket.")
+
+        replies = comment.thread.replies.select_related("commented_by")
+        return render(request, "thread_replies.html", {"replies": replies})
+
+
+SEARCH_PAGE_SIZE = 20
+
+class TicketSearchView(AccountAwareMixin, View):
+    login_url = "/login/"
+
+    def get(self, request):
+        query = request.GET.get("q", "").strip()
+        try:
+            page = max(1, int(request.GET.get("page", 1)))
+        except ValueError:
+            page = 1
+
+        # One extra hit tells whether there is a next page without counting.
+        hits = search_index.search(
+            request.user.account_id_id,
+            query,
+            limit=SEARCH_PAGE_SIZE + 1,
+            offset=(page - 1) * SEARCH_PAGE_SIZE
+        )
+        has_next = len(hits) > SEARCH_PAGE_SIZE
+        hits = hits[:SEARCH_PAGE_SIZE]
+
+        tickets = Ticket.objects.in_bulk({hit["ticket_id"] for hit in hits})
+        results = [
+            {
+                "ticket": tickets[hit["ticket_id"]],
+                "kind": hit["kind"],
+                "snippet": search_index.highlight(hit["snippet"]),
+            }
+            for hit in hits
+            if hit["ticket_id"] in tickets
+        ]
+
+        return render(request, "search_results.html", {
+            "query": query,
+            "results": results,
+            "page": page,
+            "has_next": has_next,
+        })
+
+
+def parse_int_param(value, error):
+    # The raw int() message would echo the input back; ids wider than the
+    # database integer would only fail once the response is streaming.
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(error)
+    if not is_db_int(number):
+        raise ValueError(error)
+    return number
+
+
+def ticket_list_queryset(tickets, params, fields):
+    if params.get("status"):
+        tickets = tickets.filter(status_id__in=[
+            status_registry.get(name).id for name in params["status"].split(",")
+        ])
+    if params.get("priority"):
+        tickets = tickets.filter(priority_id__in=[
+            priority_registry.get(name).id for name in params["priority"].split(",")
+        ])
+    if params.get("assignee"):
+        if params["assignee"] == "none":
+            tickets = tickets.filter(assignee_id__isnull=True)
+        else:
+            tickets = tickets.filter(
+                assignee_id=parse_int_param(params["assignee"], "assignee must be a user id or 'none'.")
+            )
+    if params.get("category"):
+        tickets = tickets.filter(ticket_category=params["category"])
+    if params.get("cursor"):
+        changed_at, pk = decode_datetime_cursor(params["cursor"])
+        tickets = tickets.filter(keyset_after("changed_at", changed_at, pk, descending=True))
+    return tickets.only(*only_columns(fields)).order_by("-changed_at", "-id")
+
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+class TicketListApiView(AccountAwareMixin, View):
+    login_url = "/login/"
+
+    def get(self, request):
+        try:
+            fields = parse_ticket_fields(request.GET.get("fields"))
+            tickets = ticket_list_queryset(self.filter_queryset_by_account(Ticket.objects.all()), request.GET, fields)
+            limit = parse_int_param(request.GET.get("limit", API_PAGE_SIZE), "limit must be a positive integer.")
+            if limit < 1:
+                raise ValueError("limit must be a positive integer.")
+            limit = min(limit, API_MAX_PAGE_SIZE)
+        except (ValueError, TicketStatus.DoesNotExist, TicketPriority.DoesNotExist) as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+
+        return StreamingHttpResponse(
+            stream_ticket_page(tickets, fields, limit),
+            content_type="application/json"
+        )
+
+
+class TicketBulkApiView(AgentRequiredMixin, AccountAwareMixin, View):
+    login_url = "/login/"
+
+    def post(self, request):
+        try:
+            payload = json.loads(request.body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("Expected a JSON object.")
+            ticket_ids = parse_ticket_ids(payload.get("ids"))
+            operation = build_operation(request.user, payload.get("operation"), payload.get("value"))
+        except (ValueError, TicketStatus.DoesNotExist, TicketPriority.DoesNotExist) as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+
+        report = apply_bulk_operation(
+            operation,
+            self.filter_queryset_by_account(Ticket.objects.all()),
+            ticket_ids
+        )
+        return JsonResponse(report)
+
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+class TicketExportView(AccountAwareMixin, View):
+    login_url = "/login/"
+
+    def get(self, request):
+        export_format = request.GET.get("format", "ndjson")
+        gzip = request.GET.get("gzip") in ("1", "true")
+        try:
+            since = parse_since(request.GET.get("since"))
+            chunks = stream_export(
+                self.filter_queryset_by_account(Ticket.objects.all()),
+                export_format,
+                since=since,
+                gzip=gzip
             )
-            notify_reply_added(reply, request.user)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
 
-        return redirect("ticket_detail", pk=ticket.pk)
\ No newline at end of file
+        filename = f"tickets.{export_format}" + (".gz" if gzip else "")
+        response = StreamingHttpResponse(
+            chunks,
+            content_type="application/gzip" if gzip else EXPORT_CONTENT_TYPES[export_format]
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
@@ -1,3 +1,6 @@
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.db.models import Q
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.contrib import messages
@@ -5,48 +8,79 @@ from django.views import View
 from ..serializers.user_form import CustomerSignupForm, AgentCreateForm, LoginForm
 from ..models.users import UserType, AppUser
 from ..permissions import CustomerRequiredMixin, AgentRequiredMixin, AccountAwareMixin
-from ..models.tickets import Ticket, TicketStatus
+from ..models.tickets import Ticket, status_registry
+from ..utils.boards import build_status_board
+from ..utils.pagination import decode_duration_cursor, encode_cursor
+from ..utils.password_pool import HashingPoolBusy
 
+UNASSIGNED_PAGE_SIZE = 25
+
+HASHING_BUSY_MESSAGE = "Too many sign-ins right now, please try again in a moment."
+
+
+def busy_response(request, template, form):
+    # Password hashing pool is saturated: answer at once instead of queueing.
+    form.add_error(None, HASHING_BUSY_MESSAGE)
+    response = render(request, template, {"form": form}, status=503)
+    response["Retry-After"] = "2"
+    return response
+
+
+async def login_session(request, user):
+    await request.session.aset('user_id', user.id)
+    await request.session.aset('account_id', user.account_id_id)
+    await request.session.aset('role', user.role)
+
+
+# Password checks and hashes run on the hashing pool
+# (ticketing.utils.password_pool). These views are async so a request awaits
+# the worker process instead of holding a thread while it hashes; the form and
+# ORM work around it runs through sync_to_async.
 class CustomerSignupView(View):
-    def get(self, request):
+    async def get(self, request):
         form = CustomerSignupForm()
-        return render(request, "signup.html", {"form": form})
+        return await sync_to_async(render)(request, "signup.html", {"form": form})
 
-    def post(self, request):
+    async def post(self, request):
         form = CustomerSignupForm(request.POST)
-        if form.is_valid():
-            user = form.save()
-            request.session['user_id'] = user.id
-            request.session['account_id'] = user.account_id.id
-            request.session['role'] = user.role
+        if await sync_to_async(form.is_valid)():
+            try:
+                user = await form.asave()
+            except HashingPoolBusy:
+                return await sync_to_async(busy_response)(request, "signup.html", form)
+            await login_session(request, user)
             return redirect("customer_dashboard_page")
-        return render(request, "signup.html", {"form": form})
+        return await sync_to_async(render)(request, "signup.html", {"form": form})
 
 class LoginView(View):
 
-    def get(self, request):
-        if request.session.get("user_id") and request.session.get("account_id"):
-            role = request.session.get("role")
+    async def get(self, request):
+        if await request.session.aget("user_id") and await request.session.aget("account_id"):
+            role = await request.session.aget("role")
             if role == UserType.CUSTOMER:
                 return redirect("customer_dashboard_page")
             else:
                 return redirect("agent_dashboard_page")
 
         form = LoginForm()
-        return render(request, "login.html", {"form": form})
-
-    def post(self, request):
-        form = LoginForm(request.POST)
-        if form.is_valid():
+        return await sync_to_async(render)(request, "login.html", {"form": form})
+
+    async def post(self, request):
+        form = LoginForm(request.POST, defer_password_check=True)
+        valid = await sync_to_async(form.is_valid)()
+        if valid:
+            try:
+                valid = await form.averify_password()
+            except HashingPoolBusy:
+                return await sync_to_async(busy_response)(request, "login.html", form)
+        if valid:
             user = form.user
-            request.session['user_id'] = user.id
-            request.session['account_id'] = user.account_id.id
-            request.session['role'] = user.role
+            await login_session(request, user)
             if user.role == UserType.CUSTOMER:
                 return redirect("customer_dashboard_page")
             else :
                 return redirect("agent_dashboard_page")
-        return render(request, "login.html", {"form": form})
+        return await sync_to_async(render)(request, "login.html", {"form": form})
 
 
 class LogoutView(View):
@@ -76,37 +110,69 @@ class AgentCreateView(CustomerRequiredMixin, View):
             "agents_form": form
         })
 
+def active_agents(account_id):
+    return AppUser.objects.filter(
+        account_id=account_id,
+        role=UserType.AGENT,
+        is_active=True
+    )
+
+
+def customer_board_tickets(user):
+    return Ticket.objects.filter(
+        creator_id=user.id
+    ).select_related(
+        "status", "priority_id", "assignee_id"
+    )
+
+
+def agent_board_tickets(user):
+    return Ticket.objects.filter(
+        assignee_id=user.id
+    ).select_related(
+        "status", "priority_id", "assignee_id"
+    )
+
+
+def unassigned_queue(account_id):
+    return Ticket.objects.filter(
+        status=status_registry.get("TODO"),
+        assignee_id__isnull=True,
+        creator_id__account_id=account_id
+    )
+
+
+def unassigned_page_queryset(unassigned):
+    # Most urgent priority (shortest SLA) first, then oldest first.
+    return unassigned.select_related("status", "priority_id", "creator_id").order_by(
+        "priority_id__duration", "created_at", "id"
+    )
+
+
 class CustomerDashboardPageView(CustomerRequiredMixin, AccountAwareMixin, View):
     login_url = "/login/"
 
     def get(self, request):
         user = request.user
 
-        agents = AppUser.objects.filter(
-            account_id=user.account_id,
-            role=UserType.AGENT,
-            is_active=True
-        )
+        agents = active_agents(user.account_id_id)
 
-        tickets = Ticket.objects.filter(
-            creator_id=user.id
-        ).select_related(
-            "status", "priority_id", "assignee_id"
+        status_columns = build_status_board(
+            customer_board_tickets(user),
+            column=request.GET.get("column"),
+            after=request.GET.get("after"),
+        )
+        board_tickets = sorted(
+            (ticket for column in status_columns for ticket in column["tickets"]),
+            key=lambda ticket: (ticket.changed_at, ticket.id),
+            reverse=True
         )
-
-        statuses = TicketStatus.objects.all().order_by("id")
-
-        status_columns = []
-        for status in statuses:
-            status_columns.append({
-                "status": status,
-                "tickets": tickets.filter(status=status)
-            })
 
         return render(request, "dashboard.html", {
             "user": user,
             "agents": agents,
-            "tickets": tickets,
+            "tickets": board_tickets,
+            "tickets_count": sum(column["count"] for column in status_columns),
             "status_columns": status_columns,
         })
 
@@ -116,33 +182,50 @@ class AgentDashboardPageView(AgentRequiredMixin, View):
     def get(self, request):
         user = request.user
 
-        assigned_tickets = Ticket.objects.filter(
-            assignee_id=user.id
-        ).select_related(
-            "status", "priority_id", "assignee_id"
+        status_columns = build_status_board(
+            agent_board_tickets(user),
+            column=request.GET.get("column"),
+            after=request.GET.get("after"),
         )
 
-        todo_status = TicketStatus.objects.get(status="TODO")
-        unassigned_todo_tickets = Ticket.objects.filter(
-            status=todo_status,
-            assignee_id__isnull=True,
-            creator_id__account_id=user.account_id
-        ).select_related("status", "priority_id", "creator_id")
-
-        statuses = TicketStatus.objects.all().order_by("id")
-        status_columns = []
-        for status in statuses:
-            status_columns.append({
-                "status": status,
-                "tickets": assigned_tickets.filter(status=status)
-            })
+        unassigned = unassigned_queue(user.account_id_id)
+        unassigned_count = unassigned.count()
+        unassigned_todo_tickets, unassigned_next_cursor = self.unassigned_page(
+            unassigned, request.GET.get("queue_after")
+        )
 
         return render(request, "dashboard.html", {
             "user": user,
             "status_columns": status_columns,
             "unassigned_todo_tickets": unassigned_todo_tickets,
+            "unassigned_count": unassigned_count,
+            "unassigned_next_cursor": unassigned_next_cursor,
         })
 
+    def unassigned_page(self, unassigned, after):
+        page = unassigned_page_queryset(unassigned)
+        if after:
+            try:
+                duration, created_at, pk = decode_duration_cursor(after)
+            except ValueError:
+                pass
+            else:
+                page = page.filter(
+                    Q(priority_id__duration__gt=duration)
+                    | Q(priority_id__duration=duration, created_at__gt=created_at)
+                    | Q(priority_id__duration=duration, created_at=created_at, id__gt=pk)
+                )
+
+        tickets = list(page[:UNASSIGNED_PAGE_SIZE + 1])
+        next_cursor = None
+        if len(tickets) > UNASSIGNED_PAGE_SIZE:
+            tickets = tickets[:UNASSIGNED_PAGE_SIZE]
+            last = tickets[-1]
+            next_cursor = encode_cursor(
+                last.priority_id.duration // timedelta(microseconds=1), last.created_at, last.pk
+            )
+        return tickets, next_cursor
+
 class AgentSoftDeleteView(CustomerRequiredMixin, View):
     login_url = "/login/"
 
@@ -154,7 +237,7 @@ class AgentSoftDeleteView(CustomerRequiredMixin, View):
         agent.save()
 
         affected_statuses = ["TODO", "In-Progress", "Waiting-For-Customer","Escalated"]
-        todo_status = TicketStatus.objects.get(status="TODO")
+        todo_status = status_registry.get("TODO")
 
         tickets_to_update = Ticket.objects.filter(
             assignee_id=agent,